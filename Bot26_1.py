@@ -5,21 +5,26 @@
 import hlt
 from hlt import constants
 from hlt.positionals import Direction, Position
+from hlt.matching import AuctionAssignment
 import logging
+import numpy as np
 
 import random
 import heapq
+import itertools
 from collections import defaultdict, deque
 import sys
 
 # Initialize and start game
-game = hlt.Game()
+game = hlt.Game(watchdog=True)
 
 ## Constants
 RETURN_T = int(constants.MAX_HALITE * 0.9) # 1 to 1000
 MINE_T = constants.MOVE_COST_RATIO * 4.5 # 1 to 1000
 BUILD_T = constants.MAX_TURNS * 0.52;
 GROWTH = 1.0025
+CANDIDATES = 8 # targets each ship bids on when planning
+HOME_STEP_COST = constants.MAX_HALITE // constants.MOVE_COST_RATIO # halite a move home is worth, keeping ships on the shortest routes
 
 ## Utility Functions
 # Tells number of turns to mine square to desired level
@@ -51,8 +56,10 @@ class Command:
 
     # Initialize our command module and create/start game
     def __init__(self, game):
-        self.commandQueue = list()
-        self.occupiedSpaces = dict()
+        self.commandQueue = list() # the commands sent last turn
+        self.moveChoices = dict() # ship: directions it would take, most preferred first
+        self.unsafeMoves = dict() # ship: direction it takes whatever else moves there
+        self.spawnWanted = False
         self.game = game
         self.me =       None # needs to be updated each game loop
         self.game_map = None # needs to be updated each game loop
@@ -61,6 +68,10 @@ class Command:
     # Starts Turn. Must be run at beginning of game loop
     def startTurn(self):
         self.game.update_frame()
+        # Kept on the game as the turn goes, so the watchdog can send them if we run out of time
+        self.moveChoices = self.game.move_choices
+        self.unsafeMoves = dict()
+        self.spawnWanted = False
         self.me =       self.game.me
         self.game_map = self.game.game_map
         self.shipyard = self.me.shipyard
@@ -73,33 +84,35 @@ class Command:
     def getHalitePos(self, pos):
         return self.game_map[pos].halite_amount
 
-    # Builds a ship if none is present
+    # Builds a ship at the end of the turn, if no ship ends up on the shipyard
     def buildShip(self):
-        if self.shipyard.position in self.occupiedSpaces:
-            return False
-        else:
-            self.commandQueue.append(self.shipyard.spawn())
-            self.occupiedSpaces[self.shipyard.position] = 0
-            return True
+        if not self.spawnWanted:
+            self.spawnWanted = True
+            self.game.queue_command(self.shipyard.spawn())
+        return True
 
-    # Moves ship to target location if no ships currently headed there
+    # Adds a direction to the ship's choices; where it actually goes is settled for every ship at once in endTurn
+    # Unsafe moves skip that and are sent as they are, crashing or not
     def moveShip(self, ship, dir, unsafe = False):
-        target = self.game_map.normalize(ship.position.directional_offset(dir))
-        if (unsafe or target not in self.occupiedSpaces) and self.canMove(ship) :
-            self.commandQueue.append(ship.move(dir))
-            self.occupiedSpaces[target] = ship.id
-            return True
-        else:
+        if not self.canMove(ship):
             return False
+        if unsafe:
+            if ship not in self.unsafeMoves:
+                self.unsafeMoves[ship] = dir
+                self.game.queue_command(ship.move(dir))
+        else:
+            self.moveChoices.setdefault(ship, list()).append(dir)
+        return True
 
-    # Holds ship steady if no ships currently headed towards our ship
+    # Adds staying still to the ship's choices
     def holdShip(self, ship):
-        if ship.position not in self.occupiedSpaces:
-            self.commandQueue.append(ship.stay_still())
-            self.occupiedSpaces[ship.position] = ship.id
-            return True
-        else:
-            return False
+        self.moveChoices.setdefault(ship, list()).append(Direction.Still)
+        return True
+
+    # Picks every ship's move from its choices as one matching, so no two of our ships share a cell,
+    # and keeps the spawn only if the shipyard is left free (the same thing the watchdog sends)
+    def resolveMoves(self):
+        self.commandQueue = self.game.hold_idle_ships(self.game.command_queue)
 
     # Moves ship towards target. Uses naive unsafe movement
     # allows for reversed order of movement preference for very simple optimization
@@ -108,10 +121,10 @@ class Command:
         moves = self.game_map.get_unsafe_moves(ship.position, pos)
         if reverse:
             moves = reversed(moves)
+        moved = False
         for dir in moves:
-            if self.moveShip(ship, dir):
-                return True
-        return False
+            moved = self.moveShip(ship, dir) or moved
+        return moved
 
     def moveShipSmart(self, ship, target, unsafe = False, maxDepth = 10):
     
@@ -150,6 +163,9 @@ class Command:
         curr = target
         # Search for target
         while toSearch:
+            # Out of time, let the backup order handle this ship
+            if self.game.deadline.expired():
+                return False
             adjCost, halite, distance, pos = heapq.heappop(toSearch)
             if pos == target:
                 curr = pos
@@ -164,7 +180,6 @@ class Command:
                     prevCell[newPos] = (Cost, pos, dir)
                 else:
                     prevCell[newPos] = min(prevCell[newPos], (Cost, pos, dir))
-            logging.info(prevCell)
 
 
         # Find original cell
@@ -174,6 +189,16 @@ class Command:
 
         return self.moveShip(ship, prevCell[curr][2])
 
+    # Whether a position holds our shipyard or one of our dropoffs
+    def isHome(self, pos):
+        structure = self.game_map[pos].structure
+        return structure is not None and structure.owner == self.me.id
+
+    # Moves ship one step along the cheapest of the shortest routes to our nearest shipyard or dropoff
+    def moveShipHome(self, ship):
+        field = self.game_map.distance_field(self.me.id, HOME_STEP_COST)
+        return self.moveShip(ship, field.next_direction(ship.position))
+
     # Gets the list of ships
     def getShips(self):
         return self.me.get_ships()
@@ -192,10 +217,10 @@ class Command:
 
     # Must be run at end of game cycle. Sends commands to game object
     def endTurn(self):
+        self.resolveMoves()
         logging.info(self.commandQueue)
+        self.game.log_summary(commands=len(self.commandQueue))
         self.game.end_turn(self.commandQueue)
-        self.commandQueue = list()
-        self.occupiedSpaces = dict()
 
 # Holds ordered orders for ships in the fleet
 # Orders are stored in the following pattern
@@ -212,40 +237,128 @@ class Command:
 # The third element is another order, to be executed if the first order fails (causes a collision)
 # This can be left blank, if hold is the desired action and collisions are acceptable
 
+# Target Registry
+# Tracks the value of every target square and which ship has claimed it
+# Every lookup is a dict access; the best unclaimed target comes off a heap
+class TargetRegistry:
+
+    # Registers every position as an unclaimed target
+    def __init__(self, positions):
+        self.entries = dict() # pos: [score, version, shipID]
+        self.shipTargets = dict() # shipID: pos
+        self.heap = list() # (-score, rank, version, pos), stale once the entry's version moves on
+        self.versions = itertools.count()
+        # Equal scores go to the larger position first, as the old sorted list did
+        self.rank = {pos: i for i, pos in enumerate(sorted(positions, reverse = True))}
+        for pos in self.rank:
+            self.entries[pos] = [0, next(self.versions), None]
+
+    # Pushes the current state of an unclaimed target onto the heap
+    def _push(self, pos, entry):
+        entry[1] = next(self.versions)
+        heapq.heappush(self.heap, (-entry[0], self.rank[pos], entry[1], pos))
+
+    # Changes the value of a single target
+    def setScore(self, pos, score):
+        entry = self.entries[pos]
+        if entry[0] != score:
+            entry[0] = score
+            if entry[2] is None:
+                self._push(pos, entry)
+
+    # Re-values every target and rebuilds the heap from scratch
+    def rescore(self, scoreOf):
+        self.heap = list()
+        for pos, entry in self.entries.items():
+            entry[0] = scoreOf(pos)
+            entry[1] = next(self.versions)
+            if entry[2] is None:
+                self.heap.append((-entry[0], self.rank[pos], entry[1], pos))
+        heapq.heapify(self.heap)
+
+    # Claims a target for a ship, releasing whatever the ship held before
+    # Returns the ID of the ship that held the target before, which is left without one, or None
+    def assign(self, shipID, pos):
+        self.unassign(shipID)
+        entry = self.entries[pos]
+        evicted = entry[2]
+        if evicted is not None:
+            del self.shipTargets[evicted]
+        entry[2] = shipID
+        self.shipTargets[shipID] = pos
+        return evicted
+
+    # Releases a ship's target so another ship can claim it
+    def unassign(self, shipID):
+        pos = self.shipTargets.pop(shipID, None)
+        if pos is not None:
+            entry = self.entries[pos]
+            entry[2] = None
+            self._push(pos, entry)
+
+    # Whether some ship has claimed the position
+    def isAssigned(self, pos):
+        entry = self.entries.get(pos)
+        return entry is not None and entry[2] is not None
+
+    # The target a ship holds, or None
+    def targetOf(self, shipID):
+        return self.shipTargets.get(shipID)
+
+    # All (shipID, pos) claims
+    def claims(self):
+        return self.shipTargets.items()
+
+    # Claims the best unclaimed target for a ship and returns it, or None if all are taken
+    def popBestUnassigned(self, shipID):
+        while self.heap:
+            negScore, rank, version, pos = heapq.heappop(self.heap)
+            entry = self.entries[pos]
+            if entry[1] == version and entry[2] is None:
+                self.assign(shipID, pos)
+                return pos
+        return None
+
+
 class Fleet:
     
     # Initializes Fleet Orders
     def __init__(self, command_module):
         self.command = command_module
         self.fleetOrders = dict() # ship.id: order tuple
-        self.targets = list() # [..., [score, target, shipID], ...]
+        self.targets = None # TargetRegistry of every square
+        self.homeDistance = None # distance from every square to our nearest structure
+        self.auction = AuctionAssignment() # keeps prices between turns
         self.initTargets()
 
-    # Updates our orders dictionary to remove any ships not currently present and add new ships
+    # Updates our orders dictionary to remove ships destroyed this turn and add ships spawned this turn
     def updateShipList(self):
-        ids = set(self.fleetOrders.keys())
-        for ship in self.command.getShips():
-            if ship.id in ids:
-                ids.remove(ship.id)
-            else:
-                self.fleetOrders[ship.id] = None    # Initialize dictionary space
-        for ID in ids:
-            self.fleetOrders[ID] = None          # Clear orders
+        for ID in self.command.me.spawned_ship_ids:
+            self.fleetOrders[ID] = None    # Initialize dictionary space
+        for ID in self.command.me.destroyed_ship_ids:
+            self.fleetOrders.pop(ID, None) # Clear orders
             self.unassignShip(ID)
 
     # Unclaims the specific target so another ship can claim it
     def unassignShip(self, ID):
-        for i in range(len(self.targets)):
-            if self.targets[i][2] == ID:
-                self.targets[i][2] = None
-                break
+        self.targets.unassign(ID)
 
     # Assigns ship to specified target location
+    # A ship that was mining the target loses its order, so it picks a new one
     def assignShip(self, ID, target):
-        logging.info(str(ID) + ": " + str(target))
-        for i in range(len(self.targets)):
-            if self.targets[i][1] == target:
-                self.targets[i][2] = ID
+        logging.info("%s: %s", ID, target)
+        evicted = self.targets.assign(ID, target)
+        if evicted is not None:
+            order = self.fleetOrders.get(evicted)
+            if order and order[0] == 'mine' and order[1] == target:
+                self.fleetOrders[evicted] = None
+
+    # Whether a ship has carried out a 'move' order to pos
+    # Moves to the shipyard go to the nearest of our structures, so any of them will do
+    def reached(self, ship, pos):
+        if pos == self.command.shipyard.position:
+            return self.command.isHome(ship.position)
+        return ship.position == pos
 
     # Used to determine if the ship is inside the region specified by the coordinate
     # Currently just means equal to coordinate, but will be extended
@@ -301,10 +414,14 @@ class Fleet:
                     return
             
         elif command == 'move': # Move to a specific place
-            if ship.position == pos:
+            if self.reached(ship, pos):
                 self.issueNewCommand(ship)
             else:
-                if not self.command.moveShipSmart(ship, pos):
+                if pos == self.command.shipyard.position:
+                    moved = self.command.moveShipHome(ship)
+                else:
+                    moved = self.command.moveShipSmart(ship, pos)
+                if not moved:
                     self._executeOrder(ship, backup)
                     return
 
@@ -318,9 +435,7 @@ class Fleet:
             dirs = Direction.get_all_cardinals()
             random.shuffle(dirs)
             for dir in dirs:
-                if self.command.moveShip(ship, dir):
-                    moved = True
-                    break
+                moved = self.command.moveShip(ship, dir) or moved
             if not moved:
                 self._executeOrder(ship, backup)
                 return
@@ -333,25 +448,78 @@ class Fleet:
             a = 1
 
         else:
-            logging.info(f"Illegal Command {command} Given to ship {ship.id}")
+            logging.info("Illegal Command %s Given to ship %s", command, ship.id)
+
+    # Adds the moves of the ship's backup orders to its choices, after the ones its order chose
+    # Moves are settled for the whole fleet at the end of the turn, so a ship whose first choice goes to
+    # another ship falls back on these instead of failing its order on the spot
+    def _offerBackups(self, ship):
+        order = self.fleetOrders.get(ship.id)
+        backup = order[2] if order else None
+        while backup:
+            self._executeOrder(ship, backup[:2] + (None,))
+            backup = backup[2]
 
     # Issues new command to ship, since it has completed it's last one
     # Contains high level strategy like choosing targets
     def issueNewCommand(self, ship):
-        for i in range(len(self.targets)):
-            if self.targets[i][2] == None:
-                self.targets[i][2] = ship.id
-                logging.info(str(ship.id) + ': ' + str(self.targets[i][1]))
-                self.fleetOrders[ship.id] = ('mine', self.targets[i][1], ('rand', None, ('hold', None, None)))
-                self._executeOrder(ship, self.fleetOrders[ship.id])
-                break
+        target = self.targets.popBestUnassigned(ship.id)
+        if target:
+            logging.info("%s: %s", ship.id, target)
+            self.fleetOrders[ship.id] = ('mine', target, ('rand', None, ('hold', None, None)))
+            self._executeOrder(ship, self.fleetOrders[ship.id])
+
+    # Whether a ship is free to take a new target: idle, back home, or still on its way to one
+    def needsTarget(self, ship):
+        order = self.fleetOrders.get(ship.id)
+        if ship.halite_amount >= RETURN_T:
+            return False
+        if not order:
+            return True
+        command, pos, backup = order
+        if command == 'move':
+            return self.reached(ship, pos)
+        return command == 'mine' and not self.inRegion(ship.position, pos)
+
+    # Assigns targets to every ship free to take one, as one auction over the whole fleet
+    # Each ship bids on its best few targets, valued as in evalTarget and discounted by the trip there
+    def planTargets(self):
+        game_map = self.command.game_map
+        ships = [ship for ship in self.command.getShips() if self.needsTarget(ship)]
+        if not ships:
+            return
+        shipIDs = set(ship.id for ship in ships)
+        taken = np.zeros((game_map.height, game_map.width), dtype=bool)
+        for shipID, pos in self.targets.claims():
+            if shipID not in shipIDs:
+                taken[pos.y, pos.x] = True
+
+        scores = game_map.halite_array() / (self.homeDistance + 1)
+        radius = game_map.width // 2 + game_map.height // 2
+        discount = [pow(GROWTH, -d) for d in range(radius + 1)]
+        candidates = game_map.best_cells(ships, scores, radius, k=CANDIDATES, excluded=taken, discount=discount)
+        benefits = dict()
+        for ship, found in zip(ships, candidates):
+            benefits[ship.id] = {pos: score for pos, distance, score in found}
+
+        plan = self.auction.solve(benefits)
+        for ship in ships:
+            target = plan.get(ship.id)
+            order = self.fleetOrders.get(ship.id)
+            if target is None:
+                # Its old target may have gone to another ship; it gets a fresh one when its order runs
+                self.unassignShip(ship.id)
+                self.fleetOrders[ship.id] = None
+                continue
+            if order and order[0] == 'mine' and order[1] == target:
+                continue
+            self.unassignShip(ship.id)
+            self.assignShip(ship.id, target)
+            self.fleetOrders[ship.id] = ('mine', target, ('rand', None, ('hold', None, None)))
 
     # Checks whether a certain position has a ship assigned already
     def posAssigned(self, pos):
-        for i in range(len(self.targets)):
-            if self.targets[i][1] == pos:
-                return self.targets[i][2] != None
-        return False
+        return self.targets.isAssigned(pos)
    
     # Finds squares that are good targets for mining
     def findTarget(self, startHalite, start, maxDis = 10):
@@ -423,32 +591,30 @@ class Fleet:
     def goodTarget(self, target):
         return self.command.getHalitePos(target) >= MINE_T
 
-    # returns the amount of halite present squared over the distance
+    # returns the amount of halite present over the distance home
     def evalTarget(self, target):
         halite = self.command.getHalitePos(target)# - MINE_T
-        distance = (self.command.game_map.calculate_distance(self.command.shipyard.position, target) + 1)
+        distance = int(self.homeDistance[target.y, target.x]) + 1
         return halite/distance
 
-    # sorts targets by value
-    def sortTargets(self):
-        self.targets.sort(reverse = True)
-
-    # updates the valuation of all targets
-    def computeTargets(self):
-        for i in range(len(self.targets)):
-            self.targets[i][0] = self.evalTarget(self.targets[i][1])
-
-    # completely updates the target list
+    # updates the valuation of the targets whose halite changed this turn
+    # a new dropoff changes the distance home of every square, so then the whole map is rescored at once
     def updateTargets(self):
-        self.computeTargets()
-        self.sortTargets()
+        game_map = self.command.game_map
+        if self.homeDistance is None or self.command.me.new_dropoff_ids:
+            structures = [self.command.shipyard] + self.command.me.get_dropoffs()
+            self.homeDistance = np.min([game_map.distances_from(s.position) for s in structures], axis = 0)
+            scores = (game_map.halite_array() / (self.homeDistance + 1)).tolist()
+            self.targets.rescore(lambda pos: scores[pos.y][pos.x])
+        else:
+            for cellID in game_map.halite_changes:
+                target = game_map.cell_position(cellID)
+                self.targets.setScore(target, self.evalTarget(target))
 
-    # initializes the list of targets
+    # initializes the registry of targets
     def initTargets(self):
         cap = self.command.game.game_map.height
-        for i in range(0, cap, 1):
-            for j in range(0, cap, 1):
-                self.targets.append([None, Position(i, j), None])
+        self.targets = TargetRegistry(Position(i, j) for i in range(0, cap, 1) for j in range(0, cap, 1))
 
     # executes the next turn for every bot
     def executeFleetOrders(self):
@@ -462,8 +628,9 @@ class Fleet:
             if ship.id in self.fleetOrders and self.fleetOrders[ship.id]:
                 self._executeOrder(ship, self.fleetOrders[ship.id])
             else:
-                logging.info(f"New Command for ship {ship.id}")
+                logging.info("New Command for ship %s", ship.id)
                 self.issueNewCommand(ship)
+            self._offerBackups(ship)
         
         logging.info(self.fleetOrders)
 
@@ -476,6 +643,7 @@ class Fleet:
     def executeTurn(self):
         self.updateShipList()
         self.updateTargets()
+        self.planTargets()
         self.executeFleetOrders()
         self.buildShips()
 
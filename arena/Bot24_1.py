@@ -162,7 +162,6 @@ class Command:
                     prevCell[newPos] = (Cost, pos, dir)
                 else:
                     prevCell[newPos] = min(prevCell[newPos], (Cost, pos, dir))
-            logging.info(prevCell)
 
 
         # Find original cell
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# Python 3.6
+
+# Batched Halite simulator for screening bot parameters
+# Advances N independent games at once, with every board and every fleet held in stacked NumPy arrays,
+# and asks a vectorized policy for the moves of all games in one call.
+#
+# The rules follow arena/engine.py (move costs, extraction, inspiration, collisions, deposits, spawns)
+# except that ships never convert into dropoffs, since the policies tuned here never build them.
+#
+#   python3 arena/batchsim.py 200 64       # screen 200 parameter sets over 64 seeded games each
+
+import sys
+import time
+
+import numpy as np
+
+import engine
+
+## Directions, indexed by move code
+STILL, NORTH, SOUTH, EAST, WEST = range(5)
+DX = np.array([0, 0, 0, 1, -1])
+DY = np.array([0, -1, 1, 0, 0])
+
+# [return, mine, build, growth] ratios, as in arena/Bot24_1.py
+BASELINE = [0.905, 4.5, 0.52, 0.0029]
+
+
+class BatchSim:
+
+    # Sets up one game per seed; every game has the same size and number of players
+    # With repeat, the games are played repeat times over: game k * len(seeds) + g is on seeds[g]'s map,
+    # which is generated once
+    # Each player can have at most maxShips ships alive at a time
+    def __init__(self, seeds, width=32, height=32, numPlayers=2, maxShips=64, turnLimit=None, repeat=1):
+        c = engine.CONSTANTS
+        self.constants = c
+        self.width = width
+        self.height = height
+        self.maxTurns = turnLimit or engine.maxTurns(width, height)
+        self.turn = 0
+        N, P, S = len(seeds) * repeat, numPlayers, maxShips
+
+        maps = [engine.generateMap(width, height, numPlayers, seed) for seed in seeds]
+        halite = np.array([rows for rows, shipyards in maps], dtype=np.int64)
+        self.halite = np.tile(halite, (repeat, 1, 1)) # (N, H, W)
+        shipyards = np.array(maps[0][1]) # the layout only depends on the size
+        self.yardX = shipyards[:, 0] # (P,)
+        self.yardY = shipyards[:, 1]
+
+        self.bank = np.full((N, P), engine.INITIAL_HALITE, dtype=np.int64) # stored halite
+        self.alive = np.zeros((N, P, S), dtype=bool)
+        self.x = np.zeros((N, P, S), dtype=np.int64)
+        self.y = np.zeros((N, P, S), dtype=np.int64)
+        self.cargo = np.zeros((N, P, S), dtype=np.int64)
+
+        # Index arrays broadcasting against (N, P, S)
+        self.games = np.arange(N)[:, None, None]
+        self.players = np.arange(P)[None, :, None]
+
+    @property
+    def shape(self):
+        return self.alive.shape
+
+    def turnsLeft(self):
+        return self.maxTurns - self.turn
+
+    # Wrapped signed offset from a coordinate to another, in (-size/2, size/2]
+    @staticmethod
+    def delta(start, end, size):
+        return (end - start + size // 2) % size - size // 2
+
+    # Number of opposing ships within the inspiration radius of every ship
+    def enemiesNearby(self):
+        N, P, S = self.shape
+        H, W = self.height, self.width
+        radius = self.constants["INSPIRATION_RADIUS"]
+        cells = ((self.games * P + self.players) * H + self.y) * W + self.x
+        occupancy = np.bincount(cells[self.alive], minlength=N * P * H * W).reshape(N, P, H, W)
+
+        # Each row of the diamond is a wrapped horizontal window, read off prefix sums
+        padded = np.concatenate([occupancy[..., W - radius:], occupancy, occupancy[..., :radius]], axis=3)
+        prefix = np.zeros(padded.shape[:3] + (padded.shape[3] + 1,), dtype=np.int64)
+        np.cumsum(padded, axis=3, out=prefix[..., 1:])
+        near = np.zeros((N, P, H, W), dtype=np.int64)
+        for dy in range(-radius, radius + 1):
+            reach = radius - abs(dy)
+            window = prefix[..., radius + reach + 1:radius + reach + 1 + W] - prefix[..., radius - reach:radius - reach + W]
+            near += np.roll(window, dy, axis=2)
+
+        enemies = near.sum(axis=1, keepdims=True) - near
+        return enemies[self.games, self.players, self.y, self.x]
+
+    # Advances every game one turn
+    # moves: (N, P, S) move codes; spawns: (N, P) booleans
+    def step(self, moves, spawns):
+        c = self.constants
+        g, p = self.games, self.players
+        inspired = self.alive & (self.enemiesNearby() >= c["INSPIRATION_SHIP_COUNT"])
+
+        # Moves, for ships that can pay for leaving their cell
+        cellHalite = self.halite[g, self.y, self.x]
+        ratio = np.where(inspired, c["INSPIRED_MOVE_COST_RATIO"], c["MOVE_COST_RATIO"])
+        cost = cellHalite // ratio
+        moving = self.alive & (moves != STILL) & (self.cargo >= cost)
+        self.cargo -= np.where(moving, cost, 0)
+        self.x = np.where(moving, (self.x + DX[moves]) % self.width, self.x)
+        self.y = np.where(moving, (self.y + DY[moves]) % self.height, self.y)
+        stayed = self.alive & ~moving
+
+        # Spawns fill the first free slot
+        slot = np.argmin(self.alive, axis=2)
+        free = ~self.alive[g[:, :, 0], p[:, :, 0], slot]
+        spawning = spawns & free & (self.bank >= c["NEW_ENTITY_ENERGY_COST"])
+        self.bank -= np.where(spawning, c["NEW_ENTITY_ENERGY_COST"], 0)
+        games, players = np.nonzero(spawning)
+        slots = slot[games, players]
+        self.alive[games, players, slots] = True
+        self.x[games, players, slots] = self.yardX[players]
+        self.y[games, players, slots] = self.yardY[players]
+        self.cargo[games, players, slots] = 0
+
+        # Ships sharing a cell sink; their cargo goes to the shipyard's owner or into the sea
+        N, P, S = self.shape
+        cells = (self.y * self.width + self.x) + (g * self.height * self.width)
+        occupancy = np.bincount(cells[self.alive], minlength=N * self.height * self.width)
+        sunk = self.alive & (occupancy[cells] > 1)
+        if sunk.any():
+            games, players, slots = np.nonzero(sunk)
+            sx, sy = self.x[sunk], self.y[sunk]
+            dropped = self.cargo[sunk]
+            yardOwner = np.full((self.height, self.width), -1)
+            yardOwner[self.yardY, self.yardX] = np.arange(P)
+            owner = yardOwner[sy, sx]
+            onYard = owner >= 0
+            np.add.at(self.bank, (games[onYard], owner[onYard]), dropped[onYard])
+            np.add.at(self.halite, (games[~onYard], sy[~onYard], sx[~onYard]), dropped[~onYard])
+            self.alive &= ~sunk
+            self.cargo[sunk] = 0
+
+        # Ships that stayed still mine, with a bonus when inspired
+        mining = stayed & self.alive
+        cellHalite = self.halite[g, self.y, self.x]
+        ratio = np.where(inspired, c["INSPIRED_EXTRACT_RATIO"], c["EXTRACT_RATIO"])
+        space = c["MAX_ENERGY"] - self.cargo
+        extracted = np.where(mining, np.minimum(-(-cellHalite // ratio), space), 0)
+        bonus = np.where(inspired, np.minimum((extracted * c["INSPIRED_BONUS_MULTIPLIER"]).astype(np.int64),
+                                              space - extracted), 0)
+        self.cargo += extracted + bonus
+        games = np.nonzero(mining)[0]
+        self.halite[games, self.y[mining], self.x[mining]] -= extracted[mining]
+
+        # Ships on their own shipyard deposit
+        home = self.alive & (self.x == self.yardX[None, :, None]) & (self.y == self.yardY[None, :, None])
+        self.bank += np.where(home, self.cargo, 0).sum(axis=2)
+        self.cargo[home] = 0
+
+        self.turn += 1
+
+    # Plays every game to the end with a policy called as policy(sim) -> (moves, spawns)
+    # Returns the final stored halite of every player, (N, P)
+    def run(self, policy):
+        while self.turn < self.maxTurns:
+            self.step(*policy(self))
+        return self.bank.copy()
+
+
+# Vectorized version of the threshold strategy in arena/Bot24_1.py
+# Ships mine cells above MINE_T, climb towards the richest cell nearby otherwise, and head home once
+# they carry RETURN_T; the shipyard builds until BUILD_T of the game has passed
+# params holds [return, mine, build, growth] ratios per player, shaped (P, 4) or per game (N, P, 4)
+# The map of where to head is refreshed every refresh turns, as halite only changes where ships mine
+class ThresholdPolicy:
+
+    def __init__(self, params, radius=8, refresh=4, seed=0):
+        self.params = np.asarray(params, dtype=np.float64)
+        self.radius = radius
+        self.refresh = refresh
+        self.rng = np.random.RandomState(seed)
+        self.returning = None
+        self.value = None
+
+    def __call__(self, sim):
+        c = sim.constants
+        N, P, S = sim.shape
+        params = np.broadcast_to(self.params, (N, P, 4))
+        returnT = (c["MAX_ENERGY"] * params[:, :, 0]).astype(np.int64)[:, :, None]
+        mineT = (c["MOVE_COST_RATIO"] * params[:, :, 1]).astype(np.int64)
+        buildTurn = (sim.maxTurns * params[:, :, 2]).astype(np.int64)
+        growth = 1 + params[:, :, 3]
+        g = sim.games
+
+        if self.value is None or sim.turn % self.refresh == 0:
+            self.value = self.headingValue(sim, mineT, growth)
+        value = self.value
+        neighborValue = np.stack([value[g, sim.players, (sim.y + DY[d]) % sim.height, (sim.x + DX[d]) % sim.width]
+                                  for d in (NORTH, SOUTH, EAST, WEST)], axis=3)
+        neighborValue += self.rng.random_sample(neighborValue.shape) # breaks ties between empty neighbours
+        climb = np.argmax(neighborValue, axis=3) + 1
+
+        # Heading home by the longer axis first
+        dx = sim.delta(sim.x, sim.yardX[None, :, None], sim.width)
+        dy = sim.delta(sim.y, sim.yardY[None, :, None], sim.height)
+        homeward = np.where(np.abs(dx) >= np.abs(dy), np.where(dx > 0, EAST, WEST), np.where(dy > 0, SOUTH, NORTH))
+        homeward = np.where((dx == 0) & (dy == 0), STILL, homeward)
+
+        if self.returning is None or self.returning.shape != sim.shape:
+            self.returning = np.zeros(sim.shape, dtype=bool)
+        self.returning = sim.alive & ~(sim.cargo == 0) & (self.returning | (sim.cargo >= returnT))
+        self.returning |= sim.alive & (sim.turnsLeft() <= np.abs(dx) + np.abs(dy) + 5)
+
+        mine = sim.halite[g, sim.y, sim.x] >= mineT[:, :, None]
+        moves = np.where(self.returning, homeward, np.where(mine, STILL, climb))
+        stuck = sim.cargo < sim.halite[g, sim.y, sim.x] // c["MOVE_COST_RATIO"]
+        moves = np.where(stuck, STILL, moves)
+        moves = self.avoidOwnCollisions(sim, moves)
+
+        # Build while the shipyard will be clear of our own ships
+        yardCell = (sim.yardY * sim.width + sim.yardX)[None, :, None]
+        targets = ((sim.y + DY[moves]) % sim.height) * sim.width + (sim.x + DX[moves]) % sim.width
+        yardTaken = (sim.alive & (targets == yardCell)).any(axis=2)
+        spawns = (sim.turn < buildTurn) & ~yardTaken
+        return moves, spawns
+
+    # Value of heading towards each cell: the best mineable halite nearby, discounted per step away
+    def headingValue(self, sim, mineT, growth):
+        value = np.where(sim.halite[:, None] >= mineT[:, :, None, None], sim.halite[:, None], 0).astype(np.float32)
+        decay = (1 / growth).astype(np.float32)[:, :, None, None]
+        for _ in range(self.radius):
+            spread = np.maximum(np.maximum(np.roll(value, 1, 2), np.roll(value, -1, 2)),
+                                np.maximum(np.roll(value, 1, 3), np.roll(value, -1, 3)))
+            np.maximum(value, spread * decay, out=value)
+        return value
+
+    # Holds back ships heading for a cell another of their own ships is taking, repeating a few times since
+    # a held ship may now be in someone's way
+    @staticmethod
+    def avoidOwnCollisions(sim, moves, rounds=4):
+        N, P, S = sim.shape
+        cells = sim.height * sim.width
+        fleet = (sim.games * P + sim.players) * cells
+        for _ in range(rounds):
+            targets = ((sim.y + DY[moves]) % sim.height) * sim.width + (sim.x + DX[moves]) % sim.width + fleet
+            # Ships staying still claim their cell first
+            order = np.argsort(np.where(sim.alive, targets * 2 + (moves != STILL), -1), axis=None, kind='stable')
+            flat = np.where(sim.alive, targets, -1).reshape(-1)[order]
+            duplicate = np.zeros(flat.shape, dtype=bool)
+            duplicate[1:] = (flat[1:] == flat[:-1]) & (flat[1:] >= 0)
+            held = np.zeros(N * P * S, dtype=bool)
+            held[order[duplicate]] = True
+            held = held.reshape(N, P, S) & (moves != STILL)
+            if not held.any():
+                break
+            moves = np.where(held, STILL, moves)
+        return moves
+
+
+# Scores parameter sets against the baseline: each set plays seat 0 of every seeded game, the baseline
+# seat 1, and the result is the median ratio of (score + 1) as in arena/abTesting.py
+def screen(paramSets, seeds, baseline=BASELINE, **simArgs):
+    paramSets = np.asarray(paramSets, dtype=np.float64)
+    K, G = len(paramSets), len(seeds)
+    sim = BatchSim(list(seeds), repeat=K, **simArgs)
+    params = np.empty((K * G, 2, 4))
+    params[:, 0] = np.repeat(paramSets, G, axis=0)
+    params[:, 1] = baseline
+    scores = sim.run(ThresholdPolicy(params))
+    ratios = (scores[:, 0] + 1) / (scores[:, 1] + 1)
+    return np.median(ratios.reshape(K, G), axis=1)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    games = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    rng = np.random.RandomState(0)
+    candidates = np.array(BASELINE) * rng.uniform(0.8, 1.2, size=(count, 4))
+
+    began = time.time()
+    ratios = screen(candidates, range(games))
+    print("Screened {} parameter sets x {} games in {:.1f}s".format(count, games, time.time() - began))
+    for i in np.argsort(-ratios)[:10]:
+        print("{:.3f}  {}".format(ratios[i], ",".join("{:.4g}".format(v) for v in candidates[i])))
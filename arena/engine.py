@@ -0,0 +1,523 @@
+#!/usr/bin/env python3
+# Python 3.6
+
+# A local Halite III game engine, so games can be run (and profiled) without the ./halite binary.
+# Implements the rules in docs/game-overview.md and speaks the same stdin/stdout protocol as
+# hlt.networking. The command line mimics the binary's, down to the --results-as-json output:
+#
+#   python3 arena/engine.py --width 32 --height 32 -s 42 --results-as-json "python3 MyBot.py" "python3 OldBot.py"
+
+import argparse
+import json
+import math
+import os
+import queue
+import random
+import signal
+import subprocess
+import threading
+import time
+
+## Constants sent to every bot, as the official engine does
+CONSTANTS = {
+    "NEW_ENTITY_ENERGY_COST": 1000,
+    "DROPOFF_COST": 4000,
+    "MAX_ENERGY": 1000,
+    "MAX_TURNS": 400,
+    "EXTRACT_RATIO": 4,
+    "MOVE_COST_RATIO": 10,
+    "INSPIRATION_ENABLED": True,
+    "INSPIRATION_RADIUS": 4,
+    "INSPIRATION_SHIP_COUNT": 2,
+    "INSPIRED_EXTRACT_RATIO": 4,
+    "INSPIRED_BONUS_MULTIPLIER": 2.0,
+    "INSPIRED_MOVE_COST_RATIO": 10,
+}
+INITIAL_HALITE = 5000
+TURN_TIME = 2.0 # seconds per turn
+INIT_TIME = 30.0 # seconds to send a name
+
+DIRECTIONS = {'n': (0, -1), 's': (0, 1), 'e': (1, 0), 'w': (-1, 0), 'o': (0, 0)}
+
+
+# Number of turns for a map size: 400 on 32x32 up to 500 on 64x64
+def maxTurns(width, height):
+    size = min(max(width, height), 64)
+    return 400 + max(0, size - 32) * 25 // 8
+
+
+## Map Generation
+# Smooth random noise on a width x height tile, summed over octaves of bilinear value noise, scaled to [0, 1]
+def _noiseTile(rng, width, height):
+    values = [[0.0] * width for _ in range(height)]
+    spacing = max(width, height)
+    weight = 1.0
+    while spacing >= 1:
+        grid = [[rng.random() for _ in range(width // spacing + 2)] for _ in range(height // spacing + 2)]
+        for y in range(height):
+            gy, ty = divmod(y / spacing, 1)
+            top, bottom = grid[int(gy)], grid[int(gy) + 1]
+            for x in range(width):
+                gx, tx = divmod(x / spacing, 1)
+                gx = int(gx)
+                upper = top[gx] + (top[gx + 1] - top[gx]) * tx
+                lower = bottom[gx] + (bottom[gx + 1] - bottom[gx]) * tx
+                values[y][x] += weight * (upper + (lower - upper) * ty)
+        spacing //= 2
+        weight *= 0.6
+
+    low = min(map(min, values))
+    high = max(map(max, values))
+    return [[(value - low) / (high - low or 1) for value in row] for row in values]
+
+
+# Builds a seeded map whose halite is mirrored so that every player sees the same board
+# Shipyards start on empty cells, as a dropoff's cell is emptied when it is built (the halite there is
+# credited to its owner), so no structure ever sits on halite
+# Returns the halite as a list of rows and the shipyard position of each player
+def generateMap(width, height, numPlayers, seed):
+    if numPlayers not in (1, 2, 4):
+        raise ValueError("Halite is played by 2 or 4 players (or 1 for testing), not {}".format(numPlayers))
+    rng = random.Random(seed)
+    tileWidth = width // 2 if numPlayers > 1 else width
+    tileHeight = height // 2 if numPlayers == 4 else height
+    tile = _noiseTile(rng, tileWidth, tileHeight)
+
+    maxHalite = CONSTANTS["MAX_ENERGY"]
+    halite = [[0] * width for _ in range(height)]
+    for y in range(height):
+        # Mirror the tile across the middle of the map, so wrapped edges meet their own reflection
+        tileY = y if y < tileHeight else height - 1 - y
+        for x in range(width):
+            tileX = x if x < tileWidth else width - 1 - x
+            value = tile[min(tileY, tileHeight - 1)][min(tileX, tileWidth - 1)]
+            halite[y][x] = min(maxHalite, int(maxHalite * value ** 4 * 1.2))
+
+    x, y = width // 4, height // 2
+    if numPlayers == 1:
+        shipyards = [(x, y)]
+    elif numPlayers == 2:
+        shipyards = [(x, y), (width - 1 - x, y)]
+    else:
+        y = height // 4
+        shipyards = [(x, y), (width - 1 - x, y), (x, height - 1 - y), (width - 1 - x, height - 1 - y)]
+    for x, y in shipyards:
+        halite[y][x] = 0
+    return halite, shipyards
+
+
+## Bot Connections
+class BotError(Exception):
+    pass
+
+
+# Bots started by this process and not yet closed, so they can be killed if the engine is terminated
+_runningBots = set()
+
+
+# Kills every running bot and exits at once, without waiting on bots that stopped reading
+def _terminate(signum, frame):
+    for bot in list(_runningBots):
+        bot.kill()
+    os._exit(1)
+
+
+# A bot running as a shell command, talking over its stdin and stdout
+# Engines only use send, receive and close, so bots can be connected some other way
+class SubprocessBot:
+
+    def __init__(self, command, cwd=None, stderr=subprocess.DEVNULL):
+        self.command = command
+        # A new session lets close kill the shell and everything it started
+        self.proc = subprocess.Popen(command, shell=True, cwd=cwd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                     stderr=stderr, start_new_session=True)
+        self.lines = queue.Queue()
+        self.reader = threading.Thread(target=self._read, daemon=True)
+        self.reader.start()
+        _runningBots.add(self)
+
+    # Moves the bot's output lines onto a queue, so receive can time out; None marks the end
+    def _read(self):
+        for line in self.proc.stdout:
+            self.lines.put(line.decode().rstrip("\r\n"))
+        self.lines.put(None)
+
+    # Sends a list of lines
+    def send(self, lines):
+        try:
+            self.proc.stdin.write(("\n".join(lines) + "\n").encode())
+            self.proc.stdin.flush()
+        except OSError:
+            raise BotError("exited")
+
+    # Returns the bot's next line, waiting at most timeout seconds (forever if None)
+    def receive(self, timeout=None):
+        try:
+            line = self.lines.get(timeout=timeout)
+        except queue.Empty:
+            raise BotError("timed out")
+        if line is None:
+            self.lines.put(None)
+            raise BotError("exited")
+        return line
+
+    # Stops the bot and anything it started
+    def close(self):
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.proc.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            pass
+        self.kill()
+        self.proc.wait()
+        _runningBots.discard(self)
+
+    # Kills the bot and anything it started, without waiting
+    def kill(self):
+        try:
+            os.killpg(self.proc.pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+## Game State
+class _Ship:
+    __slots__ = ('id', 'owner', 'cell', 'halite')
+
+    def __init__(self, ID, owner, cell):
+        self.id = ID
+        self.owner = owner
+        self.cell = cell
+        self.halite = 0
+
+
+class _Player:
+
+    def __init__(self, ID, bot, shipyard):
+        self.id = ID
+        self.bot = bot
+        self.name = None
+        self.shipyard = shipyard # cell
+        self.halite = INITIAL_HALITE
+        self.ships = dict() # id: _Ship
+        self.dropoffs = dict() # id: cell
+        self.history = list() # halite at the end of each turn, for tie breaks
+        self.deathTurn = None # turn the player died, was eliminated or crashed
+        self.error = None
+
+
+# Plays one game between connected bots
+# Cells are numbered y * width + x throughout
+class Engine:
+
+    def __init__(self, bots, width=32, height=32, seed=None, turnLimit=None, turnTime=TURN_TIME, initTime=INIT_TIME):
+        self.width = width
+        self.height = height
+        self.seed = random.randrange(2 ** 31) if seed is None else seed
+        self.turnTime = turnTime
+        self.initTime = initTime
+        self.constants = dict(CONSTANTS, MAX_TURNS=turnLimit or maxTurns(width, height), game_seed=self.seed)
+        self.maxTurns = self.constants["MAX_TURNS"]
+
+        rows, shipyards = generateMap(width, height, len(bots), self.seed)
+        self.initialMap = rows
+        self.halite = [h for row in rows for h in row]
+        self.players = [_Player(i, bot, shipyards[i][1] * width + shipyards[i][0]) for i, bot in enumerate(bots)]
+        self.structures = {player.shipyard: player.id for player in self.players} # cell: owner
+        self.changedCells = set()
+        self.nextShipID = 0
+        self.nextDropoffID = 0
+        self.turn = 0
+
+        radius = self.constants["INSPIRATION_RADIUS"]
+        self.inspirationOffsets = [(dx, dy) for dx in range(-radius, radius + 1)
+                                   for dy in range(-radius + abs(dx), radius - abs(dx) + 1)]
+
+    # Moves a cell by an offset, wrapping around the map
+    def offset(self, cell, dx, dy):
+        y, x = divmod(cell, self.width)
+        return (y + dy) % self.height * self.width + (x + dx) % self.width
+
+    def alivePlayers(self):
+        return [player for player in self.players if player.deathTurn is None]
+
+    # Removes a player from the game, e.g. after its bot crashed or broke protocol
+    def eliminate(self, player, error):
+        player.error = error
+        player.deathTurn = self.turn
+        player.ships.clear()
+
+    # Sends the pre-game data and collects each bot's name
+    def start(self):
+        header = [json.dumps(self.constants), None]
+        header += ["{} {} {}".format(player.id, player.shipyard % self.width, player.shipyard // self.width)
+                   for player in self.players]
+        header.append("{} {}".format(self.width, self.height))
+        header += [" ".join(map(str, row)) for row in self.initialMap]
+        for player in self.players:
+            header[1] = "{} {}".format(len(self.players), player.id)
+            try:
+                player.bot.send(header)
+            except BotError as error:
+                self.eliminate(player, "init: {}".format(error))
+        deadline = time.time() + self.initTime if self.initTime else None
+        for player in self.alivePlayers():
+            try:
+                player.name = player.bot.receive(deadline and max(0, deadline - time.time()))
+            except BotError as error:
+                self.eliminate(player, "init: {}".format(error))
+
+    # The lines describing the current turn to the bots
+    def frame(self):
+        lines = [str(self.turn)]
+        for player in self.players:
+            lines.append("{} {} {} {}".format(player.id, len(player.ships), len(player.dropoffs), player.halite))
+            for ship in sorted(player.ships.values(), key=lambda ship: ship.id):
+                lines.append("{} {} {} {}".format(ship.id, ship.cell % self.width, ship.cell // self.width, ship.halite))
+            for ID, cell in sorted(player.dropoffs.items()):
+                lines.append("{} {} {}".format(ID, cell % self.width, cell // self.width))
+        lines.append(str(len(self.changedCells)))
+        for cell in sorted(self.changedCells):
+            lines.append("{} {} {}".format(cell % self.width, cell // self.width, self.halite[cell]))
+        self.changedCells.clear()
+        return lines
+
+    # Parses one bot's command line into (spawn, constructs, moves), raising BotError on bad commands
+    def parseCommands(self, player, line):
+        tokens = line.split()
+        spawn = False
+        constructs = list()
+        moves = dict()
+        commanded = set()
+        i = 0
+        while i < len(tokens):
+            command = tokens[i]
+            try:
+                if command == 'g':
+                    if spawn:
+                        raise BotError("spawned twice")
+                    spawn = True
+                    i += 1
+                    continue
+                ID = int(tokens[i + 1])
+                if ID not in player.ships:
+                    raise BotError("commanded ship {} it does not own".format(ID))
+                if ID in commanded:
+                    raise BotError("commanded ship {} twice".format(ID))
+                commanded.add(ID)
+                if command == 'c':
+                    constructs.append(ID)
+                    i += 2
+                elif command == 'm' and tokens[i + 2] in DIRECTIONS:
+                    moves[ID] = tokens[i + 2]
+                    i += 3
+                else:
+                    raise BotError("bad command {!r}".format(" ".join(tokens[i:i + 3])))
+            except (IndexError, ValueError):
+                raise BotError("bad command {!r}".format(" ".join(tokens[i:i + 3])))
+        return spawn, constructs, moves
+
+    # Which ships have enough opposing ships nearby to be inspired
+    def inspiredShips(self):
+        if not self.constants["INSPIRATION_ENABLED"]:
+            return set()
+        owners = dict() # cell: owner of the ship there
+        for player in self.players:
+            for ship in player.ships.values():
+                owners[ship.cell] = player.id
+        inspired = set()
+        needed = self.constants["INSPIRATION_SHIP_COUNT"]
+        for player in self.players:
+            for ship in player.ships.values():
+                count = 0
+                for dx, dy in self.inspirationOffsets:
+                    owner = owners.get(self.offset(ship.cell, dx, dy))
+                    if owner is not None and owner != player.id:
+                        count += 1
+                if count >= needed:
+                    inspired.add(ship.id)
+        return inspired
+
+    # Plays one turn: sends the frame, collects commands and applies them
+    def playTurn(self):
+        self.turn += 1
+        lines = self.frame()
+        alive = self.alivePlayers()
+        for player in alive:
+            try:
+                player.bot.send(lines)
+            except BotError as error:
+                self.eliminate(player, "turn {}: {}".format(self.turn, error))
+
+        orders = dict()
+        deadline = time.time() + self.turnTime if self.turnTime else None
+        for player in self.alivePlayers():
+            try:
+                line = player.bot.receive(deadline and max(0, deadline - time.time()))
+                orders[player.id] = self.parseCommands(player, line)
+            except BotError as error:
+                self.eliminate(player, "turn {}: {}".format(self.turn, error))
+        self.applyCommands(orders)
+
+        for player in self.players:
+            player.history.append(player.halite)
+            if player.deathTurn is None and not player.ships and player.halite < self.constants["NEW_ENTITY_ENERGY_COST"]:
+                player.deathTurn = self.turn
+
+    # Applies every player's commands: conversions, moves, spawns, collisions, mining and deposits
+    def applyCommands(self, orders):
+        c = self.constants
+        inspired = self.inspiredShips()
+        stayed = list()
+        for ID, (spawn, constructs, moves) in sorted(orders.items()):
+            player = self.players[ID]
+
+            for shipID in constructs:
+                ship = player.ships[shipID]
+                credit = ship.halite + self.halite[ship.cell]
+                if ship.cell in self.structures or player.halite + credit < c["DROPOFF_COST"]:
+                    stayed.append(ship) # Can't convert; the ship stays still instead
+                    continue
+                player.halite += credit - c["DROPOFF_COST"]
+                self.setHalite(ship.cell, 0)
+                player.dropoffs[self.nextDropoffID] = ship.cell
+                self.structures[ship.cell] = ID
+                self.nextDropoffID += 1
+                del player.ships[shipID]
+
+            for ship in list(player.ships.values()):
+                if ship.id in constructs:
+                    continue # A conversion that failed; already staying still
+                direction = moves.get(ship.id, 'o')
+                ratio = c["INSPIRED_MOVE_COST_RATIO"] if ship.id in inspired else c["MOVE_COST_RATIO"]
+                cost = self.halite[ship.cell] // ratio
+                if direction == 'o' or ship.halite < cost:
+                    stayed.append(ship)
+                    continue
+                ship.halite -= cost
+                ship.cell = self.offset(ship.cell, *DIRECTIONS[direction])
+
+            if spawn and player.halite >= c["NEW_ENTITY_ENERGY_COST"]:
+                player.halite -= c["NEW_ENTITY_ENERGY_COST"]
+                ship = _Ship(self.nextShipID, ID, player.shipyard)
+                player.ships[ship.id] = ship
+                self.nextShipID += 1
+
+        # Ships sharing a cell sink, dropping their cargo into the sea or onto the structure there
+        occupants = dict()
+        for player in self.players:
+            for ship in player.ships.values():
+                occupants.setdefault(ship.cell, list()).append(ship)
+        for cell, ships in occupants.items():
+            if len(ships) < 2:
+                continue
+            cargo = sum(ship.halite for ship in ships)
+            if cell in self.structures:
+                self.players[self.structures[cell]].halite += cargo
+            elif cargo:
+                self.setHalite(cell, self.halite[cell] + cargo)
+            for ship in ships:
+                del self.players[ship.owner].ships[ship.id]
+
+        # Ships that stayed still mine, with a bonus when inspired
+        for ship in stayed:
+            if ship.id not in self.players[ship.owner].ships or not self.halite[ship.cell]:
+                continue
+            isInspired = ship.id in inspired
+            ratio = c["INSPIRED_EXTRACT_RATIO"] if isInspired else c["EXTRACT_RATIO"]
+            space = c["MAX_ENERGY"] - ship.halite
+            extracted = min(math.ceil(self.halite[ship.cell] / ratio), space)
+            bonus = min(int(extracted * c["INSPIRED_BONUS_MULTIPLIER"]), space - extracted) if isInspired else 0
+            self.setHalite(ship.cell, self.halite[ship.cell] - extracted)
+            ship.halite += extracted + bonus
+
+        # Ships on their own structures deposit their cargo
+        for player in self.players:
+            for ship in player.ships.values():
+                if self.structures.get(ship.cell) == player.id:
+                    player.halite += ship.halite
+                    ship.halite = 0
+
+    def setHalite(self, cell, halite):
+        self.halite[cell] = halite
+        self.changedCells.add(cell)
+
+    # Plays the whole game and returns the results in the binary's --results-as-json shape
+    def run(self):
+        began = time.time()
+        try:
+            self.start()
+            while self.turn < self.maxTurns and len(self.alivePlayers()) > (1 if len(self.players) > 1 else 0):
+                self.playTurn()
+        finally:
+            for player in self.players:
+                player.bot.close()
+        return self.results(time.time() - began)
+
+    # Ranks players: survivors first, then by how long they lasted, then by halite on the last turn,
+    # the turn before, and so on
+    def ranking(self):
+        def key(player):
+            lasted = self.maxTurns + 1 if player.deathTurn is None else player.deathTurn
+            return lasted, player.history[::-1]
+        return sorted(self.players, key=key, reverse=True)
+
+    def results(self, seconds):
+        stats = dict()
+        for rank, player in enumerate(self.ranking(), 1):
+            stats[str(player.id)] = {"rank": rank, "score": player.halite}
+        return {
+            "error_logs": {str(p.id): p.error for p in self.players if p.error},
+            "execution_time": int(seconds * 1000),
+            "map_generator": "arena.engine",
+            "map_height": self.height,
+            "map_seed": self.seed,
+            "map_width": self.width,
+            "player_names": {str(p.id): p.name for p in self.players},
+            "replay": None,
+            "stats": stats,
+            "terminated": {str(p.id): p.error is not None for p in self.players},
+            "turns": self.turn,
+        }
+
+
+# Runs a game between shell commands, taking the same arguments as the halite binary
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local game of Halite III.")
+    parser.add_argument("bots", nargs="+", help="shell commands that start each bot")
+    parser.add_argument("--width", type=int, default=32)
+    parser.add_argument("--height", type=int, default=32)
+    parser.add_argument("-s", "--seed", type=int, default=None)
+    parser.add_argument("--turn-limit", type=int, default=None)
+    parser.add_argument("--no-timeout", action="store_true", help="wait on bots forever")
+    parser.add_argument("--results-as-json", action="store_true")
+    parser.add_argument("-v", "--verbose", action="count", default=0, help="pass bot stderr through")
+    # Accepted for compatibility with the binary; this engine writes no replays or logs
+    parser.add_argument("--no-logs", action="store_true")
+    parser.add_argument("--no-replay", action="store_true")
+    parser.add_argument("-i", "--replay-directory", default=None)
+    args = parser.parse_args(argv)
+
+    # Bots run in sessions of their own, so being terminated has to take them down explicitly
+    signal.signal(signal.SIGTERM, _terminate)
+    stderr = None if args.verbose else subprocess.DEVNULL
+    bots = [SubprocessBot(command, stderr=stderr) for command in args.bots]
+    timeouts = (None, None) if args.no_timeout else (TURN_TIME, INIT_TIME)
+    engine = Engine(bots, args.width, args.height, args.seed, args.turn_limit, *timeouts)
+    results = engine.run()
+
+    if args.results_as_json:
+        print(json.dumps(results))
+    else:
+        for ID, error in sorted(results["error_logs"].items()):
+            print("[warn] Player {} was terminated ({})".format(ID, error))
+        for player in engine.ranking():
+            print("[info] Player {}, '{}', was rank {} with {} halite".format(
+                player.id, player.name, results["stats"][str(player.id)]["rank"], player.halite))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# Python 3.6
+
+# Plays games with every bot running inside this Python process, talking to arena/engine.py over
+# in-memory queues instead of a subprocess's stdin and stdout. Saves the interpreter start, the hlt
+# import and the pipes of every bot in every game.
+#
+#   python3 arena/harness.py -s 42 Bot26_1.py Bot24_0.py
+#
+# Each bot is a script run on its own thread, with hlt.common redirected to that thread's queues.
+# Every game executes each script afresh into a new module, so globals and default-argument memo
+# dicts never carry over between games. Bots import the repository's hlt, which they all share: its
+# constants come from the engine and are the same for every bot in a game, so games in one process
+# must be played one at a time. Use playGames to run games in parallel, one per pool worker.
+# In-process bots share the interpreter, so turn time limits are not enforced and a bot that never
+# returns cannot be killed.
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import traceback
+import types
+
+import engine
+
+# The repository's hlt, ahead of the stale copy next to this file
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT in sys.path:
+    sys.path.remove(ROOT)
+sys.path.insert(0, ROOT)
+
+from hlt import common
+
+
+# A one-way stream of lines between threads, read like a binary file; close marks the end
+class _Pipe:
+
+    def __init__(self):
+        self.lines = queue.Queue()
+
+    def write(self, line):
+        self.lines.put(line.encode() + b"\n")
+
+    def close(self):
+        self.lines.put(b"")
+
+    def readline(self):
+        line = self.lines.get()
+        if not line:
+            self.lines.put(b"") # stays at the end for later reads
+        return line
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+
+# A bot script running on a thread of this process
+# Has the same send, receive and close as engine.SubprocessBot, so engine.Engine can play it
+class InProcessBot:
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        with open(self.path) as source:
+            code = compile(source.read(), self.path, "exec")
+        self.toBot = _Pipe()
+        self.fromBot = queue.Queue()
+        self.error = None
+
+        # A new module for every game, so no state is left from earlier games
+        module = types.ModuleType("__main__")
+        module.__file__ = self.path
+        self.thread = threading.Thread(target=self._run, args=(code, module), daemon=True)
+        self.thread.start()
+
+    def _run(self, code, module):
+        common.redirect_streams(self.toBot, self.fromBot.put)
+        try:
+            exec(code, module.__dict__)
+        except SystemExit:
+            pass # hlt exits this way when the engine closes the input
+        except BaseException:
+            self.error = traceback.format_exc(limit=-3)
+        finally:
+            common.remove_log_handlers() # a crashed bot's log files are still open
+            self.fromBot.put(None)
+
+    def send(self, lines):
+        for line in lines:
+            self.toBot.write(line)
+
+    def receive(self, timeout=None):
+        try:
+            line = self.fromBot.get(timeout=timeout)
+        except queue.Empty:
+            raise engine.BotError("timed out")
+        if line is None:
+            self.fromBot.put(None)
+            raise engine.BotError("crashed: {}".format(self.error) if self.error else "exited")
+        return line
+
+    def close(self):
+        self.toBot.close()
+        self.thread.join(timeout=5)
+
+
+# Plays one game between bot scripts in this process, returning the engine's results
+def playGame(paths, width=32, height=32, seed=None, turnLimit=None):
+    bots = [InProcessBot(path) for path in paths]
+    return engine.Engine(bots, width, height, seed, turnLimit, turnTime=None, initTime=None).run()
+
+
+def _playJob(job):
+    return playGame(**job)
+
+
+# Plays many games, each in a pool worker process; jobs are dicts of playGame's arguments
+# Returns the results in job order
+def playGames(jobs, processes=None):
+    with multiprocessing.Pool(processes) as pool:
+        return pool.map(_playJob, jobs, chunksize=1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a game of Halite III with the bots in this process.")
+    parser.add_argument("bots", nargs="+", help="bot scripts")
+    parser.add_argument("--width", type=int, default=32)
+    parser.add_argument("--height", type=int, default=32)
+    parser.add_argument("-s", "--seed", type=int, default=None)
+    parser.add_argument("--turn-limit", type=int, default=None)
+    args = parser.parse_args(argv)
+    print(json.dumps(playGame(args.bots, args.width, args.height, args.seed, args.turn_limit)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# Python 3.6
+
+# Sequential probability ratio test between two bots: plays games in parallel batches through
+# arena/tournament.py and stops as soon as the results favour one Elo hypothesis strongly enough.
+#
+#   python3 arena/sprt.py "python3 MyBot.py" "python3 OldBot.py" --elo0 0 --elo1 20 -o sprt.jsonl
+#
+# H0 says bot A is elo0 stronger than bot B, H1 that it is elo1 stronger. The test accepts H1 when
+# the log-likelihood ratio of the win rate rises past log((1 - beta) / alpha), and accepts H0 when it
+# falls below log(beta / (1 - alpha)), so alpha and beta bound the chances of a wrong decision.
+# Draws count as half a win and half a loss. Lopsided matches finish in a handful of games.
+#
+# With --paired every seed is played twice with the seats swapped. The two games share a map, so they
+# are not independent trials: each pair is one trial scoring bot A's mean game score, 0, 1/4, 1/2, 3/4
+# or 1 (a pentanomial), and the ratio uses the normal approximation to those pair scores.
+
+import argparse
+import collections
+import json
+import math
+import os
+
+import tournament
+
+
+# Expected score of the stronger side of an Elo difference
+def expectedScore(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+# Elo difference giving an expected score
+def scoreElo(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+# Log-likelihood ratio of H1 (elo1) over H0 (elo0) for a win/draw/loss record
+def llr(wins, draws, losses, elo0, elo1):
+    p0, p1 = expectedScore(elo0), expectedScore(elo1)
+    won, lost = wins + draws / 2, losses + draws / 2
+    return won * math.log(p1 / p0) + lost * math.log((1 - p1) / (1 - p0))
+
+
+# Pairs start as one pair spread evenly over the five scores, which keeps the variance from collapsing
+# after a few identical pairs
+PAIR_PRIOR = 0.2
+
+
+# Log-likelihood ratio of H1 over H0 for pair scores, by the normal approximation: each pair's expected
+# score is that of a game, and the variance comes from the pairs played
+def pairLlr(pairScores, elo0, elo1):
+    s0, s1 = expectedScore(elo0), expectedScore(elo1)
+    weights = collections.Counter({score / 4: PAIR_PRIOR for score in range(5)})
+    weights.update(pairScores)
+    trials = sum(weights.values())
+    mean = sum(score * weight for score, weight in weights.items()) / trials
+    variance = sum((score - mean) ** 2 * weight for score, weight in weights.items()) / trials
+    return trials * (s1 - s0) * (2 * mean - s0 - s1) / (2 * variance)
+
+
+# The (lower, upper) log-likelihood ratios at which the test accepts H0 and H1
+def bounds(alpha, beta):
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+# Estimated Elo difference with a confidence interval, from the mean and spread of game scores
+def eloEstimate(wins, draws, losses, z=1.96):
+    games = wins + draws + losses
+    if not games:
+        return None, None, None
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = z * math.sqrt(variance / games)
+    return scoreElo(score), scoreElo(score - margin), scoreElo(score + margin)
+
+
+# Estimated Elo difference with a confidence interval, from the mean and spread of pair scores
+def pairEloEstimate(pairScores, z=1.96):
+    if len(pairScores) < 2:
+        return None, None, None
+    score = sum(pairScores) / len(pairScores)
+    variance = sum((pair - score) ** 2 for pair in pairScores) / (len(pairScores) - 1)
+    margin = z * math.sqrt(variance / len(pairScores))
+    return scoreElo(score), scoreElo(score - margin), scoreElo(score + margin)
+
+
+# Bot A's wins, draws and losses in finished games
+def counts(records):
+    summary = tournament.summarize(records)
+    return summary["wins"], summary["draws"], summary["losses"]
+
+
+# Bot A's mean game score on each seed whose games were all played with the seats swapped too
+def pairScores(records):
+    return [sum(1 if record["rankA"] < record["rankB"] else 0.5 if record["rankA"] == record["rankB"] else 0
+                for record in played) / len(played)
+            for played in tournament.pairedGames(records)]
+
+
+# The test's state after a set of games, with every game a trial or, when paired, every pair
+def status(records, elo0, elo1, alpha, beta, paired=False):
+    wins, draws, losses = counts(records)
+    if paired:
+        pairs = pairScores(records)
+        ratio = pairLlr(pairs, elo0, elo1)
+        elo, low, high = pairEloEstimate(pairs)
+    else:
+        ratio = llr(wins, draws, losses, elo0, elo1)
+        elo, low, high = eloEstimate(wins, draws, losses)
+    lower, upper = bounds(alpha, beta)
+    decision = "H1" if ratio >= upper else "H0" if ratio <= lower else None
+    state = {"games": wins + draws + losses, "wins": wins, "draws": draws, "losses": losses,
+             "llr": round(ratio, 3), "bounds": [round(lower, 3), round(upper, 3)], "decision": decision,
+             "elo": elo, "eloInterval": [low, high]}
+    if paired:
+        state["pairs"] = len(pairs)
+    return state
+
+
+# Plays batches of games until the test decides or maxGames are played, resuming from the results file
+# Each batch plays about batch games on the seeds following the last batch's; with paired, every seed is
+# played twice with the seats swapped and scored as one pair
+def run(botA, botB, path, elo0=0, elo1=10, alpha=0.05, beta=0.05, maxGames=2000, batch=None,
+        processes=None, size=32, players=2, paired=False, engine=tournament.ENGINE, timeout=tournament.TIMEOUT):
+    processes = processes or os.cpu_count() or 1
+    batch = batch or 2 * processes
+
+    records = list() # this match's finished games
+    seed = 0
+    state = status(records, elo0, elo1, alpha, beta, paired)
+    while not state["decision"] and state["games"] < maxGames:
+        count = min(batch, maxGames - state["games"])
+        seeds = range(seed, seed + (max(count // 2, 1) if paired else count))
+        seed = seeds.stop
+        jobs = tournament.makeJobs(botA, botB, seeds, [size], players, paired)
+        before = state["games"]
+        # Games finished by an earlier run count without being replayed
+        keys = set(tournament.jobKey(job) for job in jobs)
+        records.extend(record for record in tournament.readResults(path)
+                       if record["key"] in keys and record["status"] == "ok")
+        state = status(records, elo0, elo1, alpha, beta, paired)
+        if state["decision"]:
+            break
+
+        games = tournament.runJobs(jobs, path, processes, engine, timeout)
+        for record in games:
+            print("{key}: {status}".format(**record), flush=True)
+            if record["status"] == "ok":
+                records.append(record)
+                state = status(records, elo0, elo1, alpha, beta, paired)
+                if state["decision"]:
+                    games.close() # drops the games not yet started
+        print(json.dumps(state), flush=True)
+        if state["games"] == before:
+            break # every game in the batch failed, so more batches would too
+    return state
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two bots with a sequential probability ratio test.")
+    parser.add_argument("botA", help="shell command that starts the candidate bot")
+    parser.add_argument("botB", help="shell command that starts the reference bot")
+    parser.add_argument("--elo0", type=float, default=0, help="Elo difference under H0")
+    parser.add_argument("--elo1", type=float, default=10, help="Elo difference under H1")
+    parser.add_argument("--alpha", type=float, default=0.05, help="chance of accepting H1 when H0 holds")
+    parser.add_argument("--beta", type=float, default=0.05, help="chance of accepting H0 when H1 holds")
+    parser.add_argument("--max-games", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=None, help="games per batch (default: twice the CPU count)")
+    parser.add_argument("--size", type=int, default=32)
+    parser.add_argument("--players", type=int, choices=(2, 4), default=2)
+    parser.add_argument("--paired", action="store_true", help="play every seed twice with the seats swapped")
+    parser.add_argument("-o", "--results", default="sprt.jsonl", help="results file, appended to and resumed from")
+    parser.add_argument("-j", "--processes", type=int, default=None)
+    parser.add_argument("--timeout", type=float, default=tournament.TIMEOUT)
+    parser.add_argument("--binary", default=None, help="play with this halite executable instead of arena/engine.py")
+    args = parser.parse_args(argv)
+
+    engine = [args.binary] if args.binary else tournament.ENGINE
+    state = run(args.botA, args.botB, args.results, args.elo0, args.elo1, args.alpha, args.beta, args.max_games,
+                args.batch, args.processes, args.size, args.players, args.paired, engine, args.timeout)
+    verdict = {"H1": "accepted H1", "H0": "accepted H0", None: "undecided"}[state["decision"]]
+    if not state["games"]:
+        print("{} after no finished games".format(verdict))
+        return
+    played = "{} after {} games (+{} ={} -{})".format(
+        verdict, state["games"], state["wins"], state["draws"], state["losses"])
+    if "pairs" in state:
+        played += " in {} pairs".format(state["pairs"])
+    if state["elo"] is None:
+        print(played)
+        return
+    print("{}, Elo {:.1f} [{:.1f}, {:.1f}]".format(
+        played, state["elo"], state["eloInterval"][0], state["eloInterval"][1]))
+
+
+if __name__ == "__main__":
+    main()
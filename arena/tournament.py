@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# Python 3.6
+
+# Plays a list of games between two bots, at most one game per CPU at a time, and appends each
+# result to a JSON lines file the moment it finishes. Rerunning with the same file skips the games
+# already played, so a half-finished tournament picks up where it stopped.
+#
+#   python3 arena/tournament.py "python3 MyBot.py" "python3 OldBot.py" --games 50 --sizes 32 40 -o results.jsonl
+#
+# With --paired every seed is played again with the seats swapped, and the paired differences in score
+# ratio and rank are reported, averaged per seed; map and seat luck cancel out of them, so they need far
+# fewer games. Their confidence intervals count seeds, not games.
+#
+# Games are played by arena/engine.py, or by the halite binary with --binary ./halite, since both
+# take the same arguments. A game running past its timeout is stopped along with its bots.
+
+import argparse
+import collections
+import concurrent.futures
+import json
+import math
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+
+ENGINE = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "engine.py")]
+TIMEOUT = 600 # seconds per game
+
+# One game: which bot plays each seat is given by seats, a string of 'A' and 'B' per seat
+# (by default alternating, starting with bot A)
+Job = collections.namedtuple("Job", "botA botB seed size players seats")
+Job.__new__.__defaults__ = (None,)
+
+
+def seatsOf(job):
+    return job.seats or ("AB" * job.players)[:job.players]
+
+
+# Identifies a job in the results file
+def jobKey(job):
+    return "|".join(map(str, (job.botA, job.botB, job.seed, job.size, job.players, seatsOf(job))))
+
+
+# Plays one game and returns its result record
+# A game past its timeout is terminated, which makes the engine kill its bots, then killed outright
+def playJob(job, engine=ENGINE, timeout=TIMEOUT):
+    seats = seatsOf(job)
+    bots = [job.botA if seat == 'A' else job.botB for seat in seats]
+    args = list(engine) + ["--width", str(job.size), "--height", str(job.size), "-s", str(job.seed),
+                           "--results-as-json", "--no-logs", "--no-replay"] + bots
+    record = dict(job._asdict(), seats=seats, key=jobKey(job))
+    began = time.time()
+    proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, start_new_session=True)
+    try:
+        output, _ = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        os.killpg(proc.pid, signal.SIGTERM)
+        try:
+            proc.communicate(timeout=5)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+            proc.communicate()
+        record.update(status="timeout", seconds=round(time.time() - began, 2))
+        return record
+    record["seconds"] = round(time.time() - began, 2)
+
+    try:
+        results = json.loads(output)
+        stats = [results["stats"][str(seat)] for seat in range(len(seats))]
+    except (ValueError, KeyError):
+        record.update(status="error", returncode=proc.returncode)
+        return record
+
+    # Per bot: mean score and mean rank over the seats it played
+    for bot in "AB":
+        played = [stat for seat, stat in zip(seats, stats) if seat == bot]
+        record["score" + bot] = sum(stat["score"] for stat in played) / len(played)
+        record["rank" + bot] = sum(stat["rank"] for stat in played) / len(played)
+    record.update(status="ok", stats=stats, terminated=results.get("terminated", {}))
+    return record
+
+
+# Reads the records already in a results file
+def readResults(path):
+    if not os.path.exists(path):
+        return list()
+    with open(path) as results:
+        return [json.loads(line) for line in results if line.strip()]
+
+
+# Plays every job not already finished in the results file, at most processes games at a time
+# Each record is appended to the file and yielded as soon as its game ends
+# Closing the generator early cancels the games not yet started and waits for the running ones
+def runJobs(jobs, path, processes=None, engine=ENGINE, timeout=TIMEOUT):
+    finished = set(record["key"] for record in readResults(path) if record["status"] == "ok")
+    pending = [job for job in jobs if jobKey(job) not in finished]
+    processes = processes or os.cpu_count() or 1
+
+    with open(path, "a") as results, concurrent.futures.ThreadPoolExecutor(processes) as pool:
+        # Threads only wait on the engine processes, which do the work
+        futures = [pool.submit(playJob, job, engine, timeout) for job in pending]
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                record = future.result()
+                results.write(json.dumps(record) + "\n")
+                results.flush()
+                yield record
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+# Win, loss and draw counts for bot A, from records of finished games
+def summarize(records):
+    wins = losses = draws = 0
+    ratios = list()
+    for record in records:
+        if record["status"] != "ok":
+            continue
+        if record["rankA"] < record["rankB"]:
+            wins += 1
+        elif record["rankA"] > record["rankB"]:
+            losses += 1
+        else:
+            draws += 1
+        ratios.append((record["scoreA"] + 1) / (record["scoreB"] + 1))
+    ratios.sort()
+    median = ratios[len(ratios) // 2] if ratios else None
+    return {"wins": wins, "losses": losses, "draws": draws, "medianScoreRatio": median}
+
+
+# The seat order with bots A and B traded
+def swapSeats(seats):
+    return seats.translate(str.maketrans("AB", "BA"))
+
+
+# Seatings of a 4-player game, one per pair of mirrored seatings, each with two seats per bot
+SEATINGS_4P = ("AABB", "ABAB", "ABBA")
+
+
+# Jobs for every seed and map size
+# With paired, every seating is also played with the seats swapped, so map and seat luck cancel out of
+# the paired differences; 4-player games sample seatings of the seats for each seed from a seeded RNG
+def makeJobs(botA, botB, seeds, sizes, players, paired=False, seatings=1):
+    if not paired:
+        return [Job(botA, botB, seed, size, players) for size in sizes for seed in seeds]
+    jobs = list()
+    for size in sizes:
+        for seed in seeds:
+            if players == 2:
+                chosen = ["AB"]
+            else:
+                chosen = random.Random(seed).sample(SEATINGS_4P, min(seatings, len(SEATINGS_4P)))
+            for seats in chosen:
+                jobs.append(Job(botA, botB, seed, size, players, seats))
+                jobs.append(Job(botA, botB, seed, size, players, swapSeats(seats)))
+    return jobs
+
+
+# Mean, standard deviation and 95% confidence interval of a list of differences
+def _meanInterval(values):
+    mean = sum(values) / len(values)
+    if len(values) < 2:
+        return {"mean": mean, "stdev": None, "interval": None}
+    stdev = math.sqrt(sum((value - mean) ** 2 for value in values) / (len(values) - 1))
+    margin = 1.96 * stdev / math.sqrt(len(values))
+    return {"mean": mean, "stdev": stdev, "interval": [mean - margin, mean + margin]}
+
+
+# The games of every seed where every seating was also played swapped, as lists of records per seed
+def pairedGames(records):
+    games = collections.defaultdict(dict)
+    for record in records:
+        if record["status"] == "ok":
+            game = (record["botA"], record["botB"], record["size"], record["players"], record["seed"])
+            games[game][record["seats"]] = record
+    return [list(played.values()) for played in games.values()
+            if all(swapSeats(seats) in played for seats in played)]
+
+
+# Paired-difference statistics, over the seeds where every seating was also played swapped
+# logScoreRatio is log((scoreA + 1) / (scoreB + 1)) and rankGain is rankB - rankA, each averaged over
+# the games on a seed, so positive values favour bot A
+# The games of a seed share its map, so they are not independent: each seed is one sample, and the
+# intervals are over the per-seed means
+def pairedSummary(records):
+    seedRatios, seedRanks = list(), list()
+    for played in pairedGames(records):
+        seedRatios.append(sum(math.log((record["scoreA"] + 1) / (record["scoreB"] + 1))
+                              for record in played) / len(played))
+        seedRanks.append(sum(record["rankB"] - record["rankA"] for record in played) / len(played))
+    if not seedRatios:
+        return {"pairs": 0}
+    ratio = _meanInterval(seedRatios)
+    return {"pairs": len(seedRatios), "logScoreRatio": ratio, "rankGain": _meanInterval(seedRanks),
+            "meanScoreRatio": math.exp(ratio["mean"])}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play a tournament between two bots.")
+    parser.add_argument("botA", help="shell command that starts bot A")
+    parser.add_argument("botB", help="shell command that starts bot B")
+    parser.add_argument("--games", type=int, default=20, help="seeds per map size")
+    parser.add_argument("--first-seed", type=int, default=0)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[32])
+    parser.add_argument("--players", type=int, choices=(2, 4), default=2)
+    parser.add_argument("--paired", action="store_true", help="play every seed again with the seats swapped")
+    parser.add_argument("--seatings", type=int, default=1, help="4-player seatings sampled per seed with --paired")
+    parser.add_argument("-o", "--results", default="results.jsonl", help="results file, appended to and resumed from")
+    parser.add_argument("-j", "--processes", type=int, default=None, help="games at a time (default: CPU count)")
+    parser.add_argument("--timeout", type=float, default=TIMEOUT, help="seconds before a game is killed")
+    parser.add_argument("--binary", default=None, help="play with this halite executable instead of arena/engine.py")
+    args = parser.parse_args(argv)
+
+    seeds = range(args.first_seed, args.first_seed + args.games)
+    jobs = makeJobs(args.botA, args.botB, seeds, args.sizes, args.players, args.paired, args.seatings)
+    engine = [args.binary] if args.binary else ENGINE
+    for record in runJobs(jobs, args.results, args.processes, engine, args.timeout):
+        print("{key}: {status}".format(**record), flush=True)
+
+    keys = set(jobKey(job) for job in jobs)
+    records = [record for record in readResults(args.results) if record["key"] in keys]
+    print(json.dumps(summarize(records)))
+    if args.paired:
+        print(json.dumps(pairedSummary(records)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 
 from . import commands, entity, game_map, networking, constants
+from .deadline import Deadline
 from .networking import Game
 from .positionals import Direction, Position
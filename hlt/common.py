@@ -1,11 +1,123 @@
+import itertools
+import logging
+import sys
+import threading
+
+# Per-thread replacements for stdin and stdout, see redirect_streams
+_streams = threading.local()
+
+# Log handlers added with add_log_handler, by the input stream of the bot that added them
+_log_handlers = {}
+
+
 # Placed here to avoid circular imports
+def _end_of_input():
+    """
+    Closes this bot's log handlers and exits; called when the engine closes our input.
+    """
+    remove_log_handlers()
+    raise SystemExit(EOFError())
+
+
+def redirect_streams(reader, writer):
+    """
+    Makes the calling thread read the engine's input from reader and send its
+    commands with writer instead of using stdin and stdout, so that several
+    bots can run in one process (see arena/harness.py). Other threads are
+    unaffected.
+    :param reader: A binary file-like object supporting readline and iteration over lines, or None for stdin
+    :param writer: A callable taking one line of text, or None for stdout
+    :return: nothing.
+    """
+    _streams.reader = reader
+    _streams.writer = writer
+
+
+def current_streams():
+    """
+    :return: The (reader, writer) the calling thread was given by redirect_streams, or (None, None)
+    """
+    return getattr(_streams, "reader", None), getattr(_streams, "writer", None)
+
+
+class _BotFilter(logging.Filter):
+    """
+    Passes only records logged by threads redirected to one input stream, or
+    by threads never redirected when that stream is None.
+    """
+    def __init__(self, reader):
+        super().__init__()
+        self.reader = reader
+
+    def filter(self, record):
+        return getattr(_streams, "reader", None) is self.reader
+
+
+def add_log_handler(handler):
+    """
+    Adds a handler to the root logger that only sees the records logged by
+    the calling thread's bot, so bots sharing a process keep separate logs.
+    :param handler: The handler to add
+    :return: nothing.
+    """
+    reader = getattr(_streams, "reader", None)
+    handler.addFilter(_BotFilter(reader))
+    logging.getLogger().addHandler(handler)
+    _log_handlers.setdefault(reader, []).append(handler)
+
+
+def remove_log_handlers():
+    """
+    Removes and closes the handlers the calling thread's bot added with add_log_handler.
+    :return: nothing.
+    """
+    for handler in _log_handlers.pop(getattr(_streams, "reader", None), []):
+        logging.getLogger().removeHandler(handler)
+        handler.close()
+
+
+def _input_stream():
+    """
+    :return: The binary stream the calling thread reads the engine's input from
+    """
+    return getattr(_streams, "reader", None) or sys.stdin.buffer
+
+
+def _write_stdout(line):
+    print(line)
+    sys.stdout.flush()
+
+
+def command_writer():
+    """
+    Returns how the calling thread sends lines to the engine. Threads acting
+    for a bot (e.g. a watchdog timer) should capture this on the bot's thread.
+    :return: A callable taking one line of text
+    """
+    return getattr(_streams, "writer", None) or _write_stdout
+
+
 def read_input():
     """
-    Reads input from stdin, shutting down logging and exiting if an EOFError occurs
+    Reads a line from stdin, closing this bot's logs and exiting if the input has ended
     :return: input read
     """
-    try:
-        return input()
-    except EOFError as eof:
-        logging.shutdown()
-        raise SystemExit(eof)
+    line = _input_stream().readline()
+    if not line:
+        _end_of_input()
+    return line.decode().rstrip("\r\n")
+
+
+def read_ints(num_lines):
+    """
+    Reads several lines of whitespace separated integers from the input at once,
+    closing this bot's logs and exiting if the input ends first.
+    :param num_lines: The number of lines to read
+    :return: A flat list of every integer on those lines, in order
+    """
+    if num_lines == 0:
+        return []
+    lines = list(itertools.islice(_input_stream(), num_lines))
+    if len(lines) < num_lines:
+        _end_of_input()
+    return list(map(int, b" ".join(lines).split()))
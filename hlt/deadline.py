@@ -0,0 +1,41 @@
+import time
+
+
+class Deadline:
+    """
+    Tracks the wall-clock time budget of a single turn.
+
+    Long running code (searches in particular) should poll expired() and
+    stop with the best answer found so far once it returns True.
+    """
+    def __init__(self, budget, margin=0.0, start=None):
+        """
+        Starts the clock.
+        :param budget: The number of seconds available, starting from start
+        :param margin: The number of seconds to hold in reserve; expired() turns True this long before the budget ends
+        :param start: The time.perf_counter() value the budget started at, by default now
+        """
+        self.budget = budget
+        self.margin = margin
+        self.start = time.perf_counter() if start is None else start
+
+    def elapsed(self):
+        """
+        :return: The number of seconds since the clock started
+        """
+        return time.perf_counter() - self.start
+
+    def remaining(self):
+        """
+        :return: The number of seconds left in the budget (negative once over it)
+        """
+        return self.budget - (time.perf_counter() - self.start)
+
+    def expired(self):
+        """
+        :return: Whether the budget, less the safety margin, is used up
+        """
+        return self.remaining() <= self.margin
+
+    def __repr__(self):
+        return "{}(remaining={:.3f}s)".format(self.__class__.__name__, self.remaining())
@@ -1,9 +1,37 @@
+import heapq
 import queue
 
+try:
+    import numpy as np
+except ImportError:
+    # NumPy is optional: only the array-backed map needs it.
+    np = None
+
 from . import constants
 from .entity import Entity, Shipyard, Ship, Dropoff
 from .positionals import Direction, Position
-from .common import read_input
+from .common import read_input, read_ints
+
+# Rebuilding the halite summed-area table costs about this many passes over
+# it (tiling the map and two cumulative sums); patching one changed cell adds
+# its change to the table entries below and right of its two copies' corners
+_SUM_REBUILD_PASSES = 3
+
+# Index of each cardinal within GameMap.neighbor_ids entries
+_CARDINAL_INDEX = {direction: index for index, direction in enumerate(Direction.get_all_cardinals())}
+
+
+# The move from the neighbor in each neighbor_ids slot back to the cell
+_TOWARDS_CELL = [Direction.invert(direction) for direction in Direction.get_all_cardinals()]
+
+
+def _require_numpy(feature):
+    """
+    Raises an ImportError naming the feature if NumPy is not installed.
+    :param feature: What needs NumPy, for the error message
+    """
+    if np is None:
+        raise ImportError("{} requires numpy".format(feature))
 
 
 class Player:
@@ -16,6 +44,9 @@ class Player:
         self.halite_amount = halite
         self._ships = {}
         self._dropoffs = {}
+        self.spawned_ship_ids = set()
+        self.destroyed_ship_ids = set()
+        self.new_dropoff_ids = set()
 
     def get_ship(self, ship_id):
         """
@@ -67,26 +98,56 @@ class Player:
         player, shipyard_x, shipyard_y = map(int, read_input().split())
         return Player(player, Shipyard(player, -1, Position(shipyard_x, shipyard_y)))
 
-    def _update(self, num_ships, num_dropoffs, halite):
+    def _update(self, num_ships, num_dropoffs, halite, entity_data):
         """
         Updates this player object considering the input from the game engine for the current specific turn.
+
+        Ship and Dropoff objects persist across turns: surviving ships are
+        updated in place, so per-ship state stored on them is kept. The ids of
+        ships spawned and destroyed this turn are left in spawned_ship_ids and
+        destroyed_ship_ids, and the ids of new dropoffs in new_dropoff_ids.
         :param num_ships: The number of ships this player has this turn
         :param num_dropoffs: The number of dropoffs this player has this turn
         :param halite: How much halite the player has in total
+        :param entity_data: The integers of this player's ship lines followed by its dropoff lines, as one flat list
         :return: nothing.
         """
         self.halite_amount = halite
-        self._ships = {id: ship for (id, ship) in [Ship._generate(self.id) for _ in range(num_ships)]}
-        self._dropoffs = {id: dropoff for (id, dropoff) in [Dropoff._generate(self.id) for _ in range(num_dropoffs)]}
+        ship_values = iter(entity_data[:4 * num_ships])
+        dropoff_values = iter(entity_data[4 * num_ships:])
+
+        ships = {}
+        for ship_id, x_position, y_position, cargo in zip(ship_values, ship_values, ship_values, ship_values):
+            ship = self._ships.get(ship_id)
+            if ship is None:
+                ship = Ship(self.id, ship_id, Position(x_position, y_position), cargo)
+            else:
+                if ship.position.x != x_position or ship.position.y != y_position:
+                    ship.position = Position(x_position, y_position)
+                ship.halite_amount = cargo
+            ships[ship_id] = ship
+        self.spawned_ship_ids = ships.keys() - self._ships.keys()
+        self.destroyed_ship_ids = self._ships.keys() - ships.keys()
+        self._ships = ships
+
+        self.new_dropoff_ids = set()
+        for dropoff_id, x_position, y_position in zip(dropoff_values, dropoff_values, dropoff_values):
+            if dropoff_id not in self._dropoffs:
+                self._dropoffs[dropoff_id] = Dropoff(self.id, dropoff_id, Position(x_position, y_position))
+                self.new_dropoff_ids.add(dropoff_id)
 
 
 class MapCell:
     """A cell on the game map."""
+    # _marked is the owning GameMap's list of cells marked unsafe since its last update
+    __slots__ = ('position', 'halite_amount', 'ship', 'structure', '_marked')
+
     def __init__(self, position, halite_amount):
         self.position = position
         self.halite_amount = halite_amount
         self.ship = None
         self.structure = None
+        self._marked = None
 
     @property
     def is_empty(self):
@@ -122,6 +183,8 @@ class MapCell:
 
         Use in conjunction with GameMap.naive_navigate.
         """
+        if self.ship is None and self._marked is not None:
+            self._marked.append(self)
         self.ship = ship
 
     def __eq__(self, other):
@@ -134,17 +197,314 @@ class MapCell:
         return 'MapCell({}, halite={})'.format(self.position, self.halite_amount)
 
 
+class MapCellView(MapCell):
+    """
+    A cell of an ArrayGameMap.
+
+    Views are created on demand and hold no state of their own: reads and
+    writes go straight through to the map's arrays. The properties below
+    replace MapCell's slots, which views leave unused.
+    """
+    __slots__ = ('_game_map', '_cell_id')
+    # Views are never marked: ArrayGameMap clears its ships wholesale
+    _marked = None
+
+    def __init__(self, game_map, cell_id):
+        self._game_map = game_map
+        self._cell_id = cell_id
+
+    @property
+    def position(self):
+        return self._game_map._positions[self._cell_id]
+
+    @property
+    def halite_amount(self):
+        return self._game_map._halite_cells[self._cell_id]
+
+    @halite_amount.setter
+    def halite_amount(self, halite_amount):
+        self._game_map._flat_halite[self._cell_id] = halite_amount
+
+    @property
+    def ship(self):
+        return self._game_map._ships.get(self._cell_id)
+
+    @ship.setter
+    def ship(self, ship):
+        self._game_map._set_ship(self._cell_id, ship)
+
+    @property
+    def structure(self):
+        return self._game_map._structures.get(self._cell_id)
+
+    @structure.setter
+    def structure(self, structure):
+        self._game_map._set_structure(self._cell_id, structure)
+
+
+class DistanceField:
+    """
+    The cheapest way home from every cell of the map.
+
+    Home is any of a set of source cells (a player's structures). The cost of
+    a route is the halite spent moving along it (halite // MOVE_COST_RATIO
+    of every cell left), ties broken by the number of moves. A step_cost
+    also charges that much halite per move, for the turns a longer route
+    takes; the cheapest route can otherwise be a long detour around halite.
+    The field holds the cost, the number of moves and the first move of the
+    best route from every cell, so routing a ship home is a lookup.
+
+    Built by a multi-source Dijkstra over the torus. When halite only drops,
+    as it does when ships mine, only the cells whose routes got cheaper are
+    searched again, and a new source (a dropoff) is searched outward from on
+    its own; any other change rebuilds the field.
+    """
+    def __init__(self, game_map, sources, step_cost=0):
+        """
+        :param game_map: The map
+        :param sources: The ids of the home cells
+        :param step_cost: The halite a move is counted as costing, on top of the halite it spends
+        """
+        self._game_map = game_map
+        self.sources = frozenset(sources)
+        self.step_cost = step_cost
+        # Route keys pack (cost + step_cost * moves, moves) into one int that orders the same way
+        self._scale = game_map.width * game_map.height
+        self._pending_cells = []
+        self._rebuild()
+
+    def cost_to_home(self, position):
+        """
+        :param position: The starting position
+        :return: The halite spent on the cheapest route home, or None if there is no home
+        """
+        return self.cell_cost(self._game_map.cell_id(position))
+
+    def steps_to_home(self, position):
+        """
+        :param position: The starting position
+        :return: The number of moves on the cheapest route home, or None if there is no home
+        """
+        return self.cell_steps(self._game_map.cell_id(position))
+
+    def next_direction(self, position):
+        """
+        :param position: The starting position
+        :return: The first move of the cheapest route home (Direction.Still at home or with no home)
+        """
+        return self._direction[self._game_map.cell_id(position)]
+
+    def cell_cost(self, cell_id):
+        """
+        :param cell_id: The id of the starting cell
+        :return: The halite spent on the cheapest route home, or None if there is no home
+        """
+        key = self._key[cell_id]
+        return None if key is None else key // self._scale - self.step_cost * (key % self._scale)
+
+    def cell_steps(self, cell_id):
+        """
+        :param cell_id: The id of the starting cell
+        :return: The number of moves on the cheapest route home, or None if there is no home
+        """
+        key = self._key[cell_id]
+        return None if key is None else key % self._scale
+
+    def cell_direction(self, cell_id):
+        """
+        :param cell_id: The id of the starting cell
+        :return: The first move of the cheapest route home
+        """
+        return self._direction[cell_id]
+
+    def cost_array(self):
+        """
+        Requires NumPy.
+        :return: A (height, width) array of the halite cost home from every cell, indexed [y, x]
+        """
+        _require_numpy("DistanceField.cost_array")
+        if not self.sources:
+            raise ValueError("A distance field with no sources has no costs")
+        keys = np.array(self._key, dtype=np.int64)
+        costs = keys // self._scale - self.step_cost * (keys % self._scale)
+        return costs.reshape(self._game_map.height, self._game_map.width)
+
+    def _move_cost(self, cell_id):
+        """
+        :param cell_id: The id of a cell
+        :return: The halite needed to move off that cell
+        """
+        return self._game_map.cell_halite(cell_id) // constants.MOVE_COST_RATIO
+
+    def _rebuild(self):
+        """
+        Recomputes the whole field from scratch.
+        :return: nothing
+        """
+        num_cells = self._game_map.width * self._game_map.height
+        self._move_costs = [self._move_cost(cell_id) for cell_id in range(num_cells)]
+        self._direction = [Direction.Still] * num_cells
+        if not self.sources:
+            self._key = [None] * num_cells
+            return
+        self._key = [float('inf')] * num_cells
+        for source in self.sources:
+            self._key[source] = 0
+        self._search([(0, source) for source in sorted(self.sources)])
+
+    def _refresh(self):
+        """
+        Applies the halite changes recorded since the field was last used.
+        :return: nothing
+        """
+        if not self._pending_cells:
+            return
+        changed = {}
+        for cell_id in self._pending_cells:
+            move_cost = self._move_cost(cell_id)
+            if move_cost != self._move_costs[cell_id]:
+                changed[cell_id] = move_cost
+        self._pending_cells = []
+        if any(move_cost > self._move_costs[cell_id] for cell_id, move_cost in changed.items()):
+            self._rebuild()
+            return
+        if not self.sources:
+            for cell_id, move_cost in changed.items():
+                self._move_costs[cell_id] = move_cost
+            return
+
+        # Cheaper cells only make routes through them cheaper: lower their
+        # keys and search outward from them
+        frontier = []
+        for cell_id, move_cost in changed.items():
+            saving = (self._move_costs[cell_id] - move_cost) * self._scale
+            self._move_costs[cell_id] = move_cost
+            if cell_id not in self.sources:
+                self._key[cell_id] -= saving
+                heapq.heappush(frontier, (self._key[cell_id], cell_id))
+        self._search(frontier)
+
+    def _add_sources(self, sources):
+        """
+        Adds home cells. Routes only get cheaper, so the search just spreads
+        out from the new sources.
+        :param sources: The ids of the new home cells
+        :return: nothing
+        """
+        new_sources = set(sources) - self.sources
+        if not new_sources:
+            return
+        had_sources = bool(self.sources)
+        self.sources = self.sources | new_sources
+        if not had_sources:
+            self._rebuild()
+            return
+        frontier = []
+        for source in sorted(new_sources):
+            self._key[source] = 0
+            self._direction[source] = Direction.Still
+            frontier.append((0, source))
+        self._search(frontier)
+
+    def _search(self, frontier):
+        """
+        Runs Dijkstra outward from a frontier, backwards along moves, lowering
+        the key and first move of every cell reached more cheaply.
+        :param frontier: A heap of (key, cell id) pairs to search from
+        :return: nothing
+        """
+        key = self._key
+        direction = self._direction
+        move_costs = self._move_costs
+        neighbor_ids = self._game_map.neighbor_ids
+        scale = self._scale
+        step_cost = self.step_cost
+        while frontier:
+            cell_key, cell_id = heapq.heappop(frontier)
+            if cell_key != key[cell_id]:
+                continue
+            for index, neighbor in enumerate(neighbor_ids[cell_id]):
+                neighbor_key = cell_key + (move_costs[neighbor] + step_cost) * scale + 1
+                if neighbor_key < key[neighbor]:
+                    key[neighbor] = neighbor_key
+                    direction[neighbor] = _TOWARDS_CELL[index]
+                    heapq.heappush(frontier, (neighbor_key, neighbor))
+
+
 class GameMap:
     """
     The game map.
 
     Can be indexed by a position, or by a contained entity.
     Coordinates start at 0. Coordinates are normalized for you
+
+    Cells can also be addressed by an integer cell id (y * width + x).
+    neighbor_ids[cell_id] holds the ids of the four wrapped neighbors of a
+    cell, in Direction.get_all_cardinals() order, so searches can run on
+    plain ints instead of Position objects.
+
+    The map keeps exactly one Position per cell: normalize, offset and
+    cell_position all return these shared objects instead of allocating.
+
+    After each update, halite_changes lists the ids of the cells whose halite
+    the engine reported this turn and occupancy_changes the ids of the cells
+    that gained, lost or changed ship since last turn.
+
+    Region halite queries (region_halite, diamond_halite) are answered from a
+    wrapped summed-area table that is built on first use and then patched
+    from halite_changes each turn. They require NumPy and, like
+    halite_changes, only see halite changes reported by the engine.
+
+    inspiration_counts and inspired give, for every cell, how many opposing
+    ships are within INSPIRATION_RADIUS and whether that inspires a ship
+    there. They are computed once per turn from the ships' positions by a
+    wrapped diamond convolution and require NumPy.
+
+    distance_field(player_id, step_cost) gives the cheapest route home from
+    every cell to that player's structures. Fields are cached and kept up to date as
+    halite changes and dropoffs are built.
     """
     def __init__(self, cells, width, height):
         self.width = width
         self.height = height
         self._cells = cells
+        self._positions = [Position(x, y) for y in range(height) for x in range(width)]
+        if cells is not None:
+            self._flat_cells = [cell for row in cells for cell in row]
+            self._marked_cells = []
+            for cell, position in zip(self._flat_cells, self._positions):
+                cell.position = position
+                cell._marked = self._marked_cells
+        self.halite_changes = []
+        self.occupancy_changes = []
+        # Cell id -> (owner, ship id) of every ship on the map
+        self._occupancy = {}
+        # Prefix sums of the map tiled 2x2, the flat halite they were built
+        # from, and the changed cells not yet applied to them
+        self._halite_sums = None
+        self._summed_halite = None
+        self._unsummed_cells = []
+        # Radius -> diamond_halite_sums for the current turn
+        self._diamond_sums = {}
+        # Owner -> ships within INSPIRATION_RADIUS of every cell, this turn
+        self._nearby_ships = None
+        # Radius -> (dy, dx, distance) arrays of the cells within it, nearest first
+        self._diamond_offsets = {}
+        # Owner -> ids of the cells holding their structures
+        self._structure_ids = {}
+        # Owner -> DistanceField to those structures
+        self._distance_fields = {}
+        self.neighbor_ids = [
+            (((y - 1) % height) * width + x,
+             ((y + 1) % height) * width + x,
+             y * width + (x + 1) % width,
+             y * width + (x - 1) % width)
+            for y in range(height) for x in range(width)
+        ]
+        # Wrapped distance along each axis, indexed by the coordinate
+        # difference modulo the map size
+        self._x_distance = [min(dx, width - dx) for dx in range(width)]
+        self._y_distance = [min(dy, height - dy) for dy in range(height)]
 
     def __getitem__(self, location):
         """
@@ -167,11 +527,322 @@ class GameMap:
         :param target: The target to where calculate
         :return: The distance between these items
         """
-        source = self.normalize(source)
-        target = self.normalize(target)
-        resulting_position = abs(source - target)
-        return min(resulting_position.x, self.width - resulting_position.x) + \
-            min(resulting_position.y, self.height - resulting_position.y)
+        return self._x_distance[(source.x - target.x) % self.width] + \
+            self._y_distance[(source.y - target.y) % self.height]
+
+    def cell_distance(self, source_id, target_id):
+        """
+        Compute the Manhattan distance between two cell ids.
+        Accounts for wrap-around.
+        :param source_id: The id of the source cell
+        :param target_id: The id of the target cell
+        :return: The distance between these cells
+        """
+        return self._x_distance[(source_id - target_id) % self.width] + \
+            self._y_distance[(source_id // self.width - target_id // self.width) % self.height]
+
+    def distances_from(self, source):
+        """
+        Compute the Manhattan distance from one location to every cell.
+        Accounts for wrap-around. Requires NumPy.
+        :param source: The source position
+        :return: A (height, width) array of distances, indexed [y, x]
+        """
+        _require_numpy("distances_from")
+        x_distance = np.roll(np.array(self._x_distance), source.x % self.width)
+        y_distance = np.roll(np.array(self._y_distance), source.y % self.height)
+        return y_distance[:, None] + x_distance[None, :]
+
+    def distance_matrix(self, sources, targets):
+        """
+        Compute the Manhattan distance between every source and every target.
+        Accounts for wrap-around. Requires NumPy.
+        :param sources: A sequence of positions (or entities)
+        :param targets: A sequence of positions (or entities)
+        :return: A (len(sources), len(targets)) array of distances
+        """
+        _require_numpy("distance_matrix")
+        source_x, source_y = self._coordinate_arrays(sources)
+        target_x, target_y = self._coordinate_arrays(targets)
+        dx = (source_x[:, None] - target_x[None, :]) % self.width
+        dy = (source_y[:, None] - target_y[None, :]) % self.height
+        return np.minimum(dx, self.width - dx) + np.minimum(dy, self.height - dy)
+
+    @staticmethod
+    def _coordinate_arrays(locations):
+        """
+        Splits positions or entities into arrays of x and y coordinates.
+        :param locations: A sequence of positions (or entities)
+        :return: A tuple of the x array and the y array
+        """
+        positions = [location.position if isinstance(location, Entity) else location
+                     for location in locations]
+        return (np.array([position.x for position in positions], dtype=np.int64),
+                np.array([position.y for position in positions], dtype=np.int64))
+
+    def halite_array(self):
+        """
+        Returns the halite of every cell as an array. Requires NumPy.
+        :return: A (height, width) array, indexed [y, x]
+        """
+        _require_numpy("halite_array")
+        return np.array([cell.halite_amount for cell in self._flat_cells],
+                        dtype=np.int64).reshape(self.height, self.width)
+
+    def region_halite(self, position, width, height):
+        """
+        Sums the halite in a rectangle of cells, considering wraparound. Requires NumPy.
+        :param position: The top left (lowest x and y) corner of the rectangle
+        :param width: The number of columns, at most the map width
+        :param height: The number of rows, at most the map height
+        :return: The total halite in the rectangle
+        """
+        if not (0 <= width <= self.width and 0 <= height <= self.height):
+            raise ValueError("Region {}x{} does not fit the map".format(width, height))
+        sums = self._refresh_halite_sums()
+        x = position.x % self.width
+        y = position.y % self.height
+        return int(sums[y + height, x + width] - sums[y, x + width] - sums[y + height, x] + sums[y, x])
+
+    def diamond_halite(self, position, radius):
+        """
+        Sums the halite in every cell within a Manhattan distance of a position,
+        considering wraparound. Requires NumPy.
+
+        The first query of a radius in a turn computes the sums around every
+        cell at once (see diamond_halite_sums); later queries are lookups.
+        :param position: The center of the diamond
+        :param radius: The Manhattan radius
+        :return: The total halite in the diamond
+        """
+        return int(self.diamond_halite_sums(radius)[position.y % self.height, position.x % self.width])
+
+    def diamond_halite_sums(self, radius):
+        """
+        Sums the halite within a Manhattan distance of every cell, considering
+        wraparound. Cached until the halite changes. Requires NumPy.
+        :param radius: The Manhattan radius
+        :return: A (height, width) array of sums, indexed [y, x]
+        """
+        if radius not in self._diamond_sums:
+            self._diamond_sums[radius] = self._diamond_convolve(self._refresh_halite_sums(), radius)
+        return self._diamond_sums[radius]
+
+    def best_cells(self, sources, scores, radius, k=1, excluded=None, discount=None):
+        """
+        Finds the highest scoring cells within a Manhattan distance of each of
+        several positions, all in one batch. Accounts for wrap-around. Requires NumPy.
+        :param sources: A sequence of positions (or entities) to search around
+        :param scores: A (height, width) array of cell values, e.g. halite_array()
+        :param radius: The Manhattan radius to search
+        :param k: How many cells to return per source
+        :param excluded: An optional (height, width) boolean array of cells to skip, e.g. already assigned targets
+        :param discount: An optional sequence of radius + 1 factors; a cell's score is multiplied by discount[distance]
+        :return: For each source, a list of up to k (position, distance, score) tuples, best first,
+                 nearest first among equal scores
+        """
+        _require_numpy("best_cells")
+        if radius not in self._diamond_offsets:
+            self._diamond_offsets[radius] = self._offsets_within(radius)
+        offset_y, offset_x, distance = self._diamond_offsets[radius]
+        source_x, source_y = self._coordinate_arrays(sources)
+
+        cell_ids = ((source_y[:, None] + offset_y) % self.height) * self.width + \
+            (source_x[:, None] + offset_x) % self.width
+        values = np.asarray(scores, dtype=np.float64).reshape(-1)[cell_ids]
+        if discount is not None:
+            values = values * np.asarray(discount, dtype=np.float64)[distance]
+        if excluded is not None:
+            values[np.asarray(excluded).reshape(-1)[cell_ids]] = -np.inf
+
+        # Offsets are sorted nearest first, so a stable sort prefers nearer cells on ties
+        best = np.argsort(-values, axis=1, kind='stable')[:, :k]
+        results = []
+        for row, columns in enumerate(best):
+            results.append([(self._positions[cell_ids[row, column]], int(distance[column]), float(values[row, column]))
+                            for column in columns if values[row, column] != -np.inf])
+        return results
+
+    def _offsets_within(self, radius):
+        """
+        Lists the wrapped offsets of every distinct cell within a Manhattan radius.
+        :param radius: The Manhattan radius
+        :return: A tuple of dy, dx and distance arrays, sorted by distance
+        """
+        offsets = [(self._y_distance[dy] + self._x_distance[dx], dy, dx)
+                   for dy in range(self.height) for dx in range(self.width)
+                   if self._y_distance[dy] + self._x_distance[dx] <= radius]
+        offsets.sort()
+        distance, offset_y, offset_x = (np.array(column, dtype=np.int64) for column in zip(*offsets))
+        return offset_y, offset_x, distance
+
+    def distance_field(self, player_id, step_cost=0):
+        """
+        Returns the cheapest routes home to a player's structures (see DistanceField).
+        :param player_id: The player owning the structures
+        :param step_cost: The halite each move is counted as costing, on top of the halite it spends
+        :return: The up to date DistanceField
+        """
+        sources = self._structure_ids.get(player_id, set())
+        field = self._distance_fields.get((player_id, step_cost))
+        if field is None or not field.sources <= sources:
+            field = self._distance_fields[player_id, step_cost] = DistanceField(self, sources, step_cost)
+        else:
+            field._refresh()
+            field._add_sources(sources)
+        return field
+
+    def inspiration_counts(self, player_id):
+        """
+        Counts the opposing ships within INSPIRATION_RADIUS of every cell. Requires NumPy.
+        :param player_id: The player whose opponents to count
+        :return: A (height, width) array of ship counts, indexed [y, x]
+        """
+        nearby = self._nearby_ship_counts()
+        return nearby[None] - nearby.get(player_id, 0)
+
+    def inspired(self, player_id):
+        """
+        Finds the cells where a ship of a player would be inspired. Requires NumPy.
+        :param player_id: The player owning the ship
+        :return: A (height, width) boolean array, indexed [y, x]
+        """
+        if not constants.INSPIRATION_ENABLED:
+            return np.zeros((self.height, self.width), dtype=bool)
+        return self.inspiration_counts(player_id) >= constants.INSPIRATION_SHIP_COUNT
+
+    def extraction_array(self, player_id):
+        """
+        Computes the halite a ship of a player would collect by staying on
+        each cell for one turn, including the inspiration bonus but ignoring
+        the ship's capacity. Requires NumPy.
+        :param player_id: The player owning the ship
+        :return: A (height, width) array of halite, indexed [y, x]
+        """
+        halite = self.halite_array().astype(np.int64)
+        inspired = self.inspired(player_id)
+        # Extraction rounds up
+        collected = -(-halite // constants.EXTRACT_RATIO)
+        inspired_collected = -(-halite // constants.INSPIRED_EXTRACT_RATIO)
+        inspired_collected += (inspired_collected * constants.INSPIRED_BONUS_MULTIPLIER).astype(np.int64)
+        return np.where(inspired, inspired_collected, collected)
+
+    def _nearby_ship_counts(self):
+        """
+        Counts, per owner, the ships within INSPIRATION_RADIUS of every cell.
+        Cached until the ships move.
+        :return: A dict of owner -> (height, width) array of counts, with
+                 None mapping to the count over all owners
+        """
+        _require_numpy("Inspiration")
+        if self._nearby_ships is None:
+            planes = {None: np.zeros(self.width * self.height, dtype=np.int64)}
+            for cell_id, (owner, _) in self._occupancy.items():
+                if owner not in planes:
+                    planes[owner] = np.zeros(self.width * self.height, dtype=np.int64)
+                planes[owner][cell_id] += 1
+                planes[None][cell_id] += 1
+            self._nearby_ships = {
+                owner: self._diamond_convolve(self._summed_area_table(plane.reshape(self.height, self.width)),
+                                              constants.INSPIRATION_RADIUS)
+                for owner, plane in planes.items()
+            }
+        return self._nearby_ships
+
+    def _summed_area_table(self, values):
+        """
+        Builds the wrapped summed-area table of an array: the prefix sums of
+        the array tiled 2x2, so every wrapped rectangle is a single query.
+        :param values: A (height, width) array
+        :return: A (2 * height + 1, 2 * width + 1) int64 array
+        """
+        sums = np.zeros((2 * self.height + 1, 2 * self.width + 1), dtype=np.int64)
+        sums[1:, 1:] = np.tile(values, (2, 2)).cumsum(axis=0).cumsum(axis=1)
+        return sums
+
+    def _diamond_convolve(self, sums, radius):
+        """
+        Sums an array over the diamond of a Manhattan radius around every cell,
+        one row offset at a time, using its wrapped summed-area table.
+        :param sums: The wrapped summed-area table of the array
+        :param radius: The Manhattan radius
+        :return: A (height, width) int64 array of sums
+        """
+        columns = np.arange(self.width)[None, :]
+        rows = np.arange(self.height)[:, None]
+        total = np.zeros((self.height, self.width), dtype=np.int64)
+        for dy in range(self.height):
+            reach = radius - self._y_distance[dy]
+            if reach < 0:
+                continue
+            span = min(2 * reach + 1, self.width)
+            top = (rows + dy) % self.height
+            left = (columns - reach) % self.width if span < self.width else np.zeros_like(columns)
+            total += sums[top + 1, left + span] - sums[top, left + span] - sums[top + 1, left] + sums[top, left]
+        return total
+
+    def _refresh_halite_sums(self):
+        """
+        Brings the halite summed-area table up to date, patching in the cells
+        changed since it was last used, or rebuilding it when patching would
+        touch more of the table than a rebuild. Patching a cell touches about
+        the whole table, so a rebuild wins from about _SUM_REBUILD_PASSES
+        changed cells on.
+        :return: The table
+        """
+        _require_numpy("Region halite queries")
+        if self._halite_sums is None:
+            self._rebuild_halite_sums()
+            return self._halite_sums
+        halite = self.halite_array().reshape(-1)
+        cells = np.unique(np.array(self._unsummed_cells, dtype=np.int64))
+        deltas = halite[cells] - self._summed_halite[cells]
+        cells, deltas = cells[deltas != 0], deltas[deltas != 0]
+        self._unsummed_cells = []
+        if not cells.size:
+            return self._halite_sums
+        ys, xs = np.divmod(cells, self.width)
+        patched = int(((3 * self.height - 2 * ys) * (3 * self.width - 2 * xs)).sum())
+        if patched > _SUM_REBUILD_PASSES * self._halite_sums.size:
+            self._rebuild_halite_sums()
+            return self._halite_sums
+        self._summed_halite[cells] += deltas
+        for y, x, delta in zip(ys.tolist(), xs.tolist(), deltas.tolist()):
+            for row in (y + 1, y + self.height + 1):
+                for column in (x + 1, x + self.width + 1):
+                    self._halite_sums[row:, column:] += delta
+        return self._halite_sums
+
+    def _rebuild_halite_sums(self):
+        """
+        Rebuilds the halite summed-area table from scratch.
+        :return: nothing
+        """
+        halite = self.halite_array()
+        self._halite_sums = self._summed_area_table(halite)
+        self._summed_halite = halite.reshape(-1).astype(np.int64)
+        self._unsummed_cells = []
+
+    def _record_halite_changes(self):
+        """
+        Invalidates the cached halite aggregates after an update.
+        :return: nothing
+        """
+        if self.halite_changes:
+            self._diamond_sums.clear()
+            if self._halite_sums is not None:
+                self._unsummed_cells.extend(self.halite_changes)
+            for field in self._distance_fields.values():
+                field._pending_cells.extend(self.halite_changes)
+
+    def _place_structure(self, structure):
+        """
+        Places a shipyard or dropoff on the map.
+        :param structure: The structure to place
+        :return: nothing
+        """
+        self[structure.position].structure = structure
+        self._structure_ids.setdefault(structure.owner, set()).add(self.cell_id(structure.position))
 
     def normalize(self, position):
         """
@@ -182,7 +853,72 @@ class GameMap:
         :param position: A position object.
         :return: A normalized position object fitting within the bounds of the map
         """
-        return Position(position.x % self.width, position.y % self.height)
+        return self._positions[(position.y % self.height) * self.width + position.x % self.width]
+
+    def offset(self, position, direction):
+        """
+        Returns the normalized position one step away in a direction.
+        Equivalent to normalize(position.directional_offset(direction)) without allocating.
+        :param position: A position object.
+        :param direction: The Direction cardinal tuple
+        :return: The normalized neighboring position
+        """
+        return self._positions[self.offset_id(self.cell_id(position), direction)]
+
+    def cell_id(self, position):
+        """
+        Returns the cell id of a position. The position need not be normalized.
+        :param position: A position object.
+        :return: The id (y * width + x) of the cell at that position
+        """
+        return (position.y % self.height) * self.width + position.x % self.width
+
+    def cell_position(self, cell_id):
+        """
+        Returns the normalized position of a cell id.
+        :param cell_id: The id of the cell
+        :return: The position of that cell
+        """
+        return self._positions[cell_id]
+
+    def offset_id(self, cell_id, direction):
+        """
+        Returns the id of the cell one step away in a direction, considering wraparound.
+        :param cell_id: The id of the starting cell
+        :param direction: The Direction cardinal tuple (Direction.Still is allowed)
+        :return: The id of the neighboring cell
+        """
+        if direction == Direction.Still:
+            return cell_id
+        return self.neighbor_ids[cell_id][_CARDINAL_INDEX[direction]]
+
+    def cell_by_id(self, cell_id):
+        """
+        :param cell_id: The id of the cell
+        :return: The contents of that cell
+        """
+        return self._flat_cells[cell_id]
+
+    def cell_halite(self, cell_id):
+        """
+        :param cell_id: The id of the cell
+        :return: The halite in that cell
+        """
+        return self._flat_cells[cell_id].halite_amount
+
+    def cell_ship(self, cell_id):
+        """
+        :param cell_id: The id of the cell
+        :return: The ship marked on that cell, or None
+        """
+        return self._flat_cells[cell_id].ship
+
+    def cell_is_occupied(self, cell_id):
+        """
+        :param cell_id: The id of the cell
+        :return: Whether a ship is marked on that cell
+        """
+        return self._flat_cells[cell_id].ship is not None
 
     @staticmethod
     def _get_target_direction(source, target):
@@ -244,25 +980,205 @@ class GameMap:
         :return: The map object
         """
         map_width, map_height = map(int, read_input().split())
-        game_map = [[None for _ in range(map_width)] for _ in range(map_height)]
-        for y_position in range(map_height):
-            cells = read_input().split()
-            for x_position in range(map_width):
-                game_map[y_position][x_position] = MapCell(Position(x_position, y_position),
-                                                           int(cells[x_position]))
+        halite = read_ints(map_height)
+        game_map = [[MapCell(Position(x_position, y_position), halite[y_position * map_width + x_position])
+                     for x_position in range(map_width)]
+                    for y_position in range(map_height)]
         return GameMap(game_map, map_width, map_height)
 
-    def _update(self):
+    def _update(self, cell_data):
         """
         Updates this map object from the input given by the game engine
+        :param cell_data: The integers of this turn's cell update lines, as one flat list
+        :return: nothing
+        """
+        # Mark cells as safe for navigation (will re-mark unsafe cells
+        # later). Only the cells marked since the last update need clearing.
+        for cell in self._marked_cells:
+            cell.ship = None
+        self._marked_cells.clear()
+
+        self.halite_changes = []
+        cell_values = iter(cell_data)
+        for cell_x, cell_y, cell_energy in zip(cell_values, cell_values, cell_values):
+            cell_id = cell_y * self.width + cell_x
+            self._flat_cells[cell_id].halite_amount = cell_energy
+            self.halite_changes.append(cell_id)
+        self._record_halite_changes()
+
+    def _mark_ship(self, cell_id, ship):
+        """
+        Marks a ship as occupying a cell.
+        :param cell_id: The id of the cell
+        :param ship: The ship occupying the cell
+        """
+        self._flat_cells[cell_id].mark_unsafe(ship)
+
+    def _mark_ships(self, ships):
+        """
+        Marks every ship on the map as unsafe for navigation and records
+        which cells changed occupancy since the last turn.
+        :param ships: All ships on the map this turn
+        :return: nothing
+        """
+        occupancy = {}
+        for ship in ships:
+            cell_id = self.cell_id(ship.position)
+            ship.position = self._positions[cell_id]
+            self._mark_ship(cell_id, ship)
+            occupancy[cell_id] = (ship.owner, ship.id)
+
+        previous = self._occupancy
+        self.occupancy_changes = [cell_id for cell_id, occupant in occupancy.items()
+                                  if previous.get(cell_id) != occupant]
+        self.occupancy_changes.extend(cell_id for cell_id in previous if cell_id not in occupancy)
+        self._occupancy = occupancy
+        self._nearby_ships = None
+
+
+class ArrayGameMap(GameMap):
+    """
+    A game map whose state lives in contiguous NumPy arrays.
+
+    halite holds the halite of every cell (int32), ship_owner and ship_id
+    the owner and id of the ship marked on every cell and structure_owner
+    the owner of the structure on every cell (int16, -1 when empty). All
+    arrays are indexed [y, x].
+
+    Indexing the map still returns a cell, but it is a MapCellView created
+    on demand over the arrays, so bots written against GameMap keep working
+    unchanged. Per-cell reads are not faster than GameMap's: building a view
+    makes game_map[position] about twice as slow as a stored cell, and the
+    id-based cell_halite, cell_ship and cell_is_occupied, which skip the view
+    and the Position, only come close. The gains are in the whole-map array
+    methods (halite_array, diamond sums, best_cells and the like), which use
+    the arrays directly instead of copying the map each turn. Opt in with
+    Game(array_map=True). Requires NumPy.
+    """
+    def __init__(self, halite, width, height):
+        _require_numpy("ArrayGameMap")
+        super().__init__(None, width, height)
+        self.halite = np.array(halite, dtype=np.int32).reshape(height, width)
+        self.ship_owner = np.full((height, width), -1, dtype=np.int16)
+        self.ship_id = np.full((height, width), -1, dtype=np.int16)
+        self.structure_owner = np.full((height, width), -1, dtype=np.int16)
+        # Flat views sharing memory with the arrays above, indexed by cell id
+        self._flat_halite = self.halite.reshape(-1)
+        self._flat_ship_owner = self.ship_owner.reshape(-1)
+        self._flat_ship_id = self.ship_id.reshape(-1)
+        self._flat_structure_owner = self.structure_owner.reshape(-1)
+        # Reads through the memoryview give Python ints without boxing a NumPy scalar
+        self._halite_cells = memoryview(self._flat_halite)
+        self._ships = {}
+        self._structures = {}
+
+    def __getitem__(self, location):
+        """
+        Getter for position object or entity objects within the game map
+        :param location: the position or entity to access in this map
+        :return: a view of the cell at that position or entity
+        """
+        if isinstance(location, Position):
+            return MapCellView(self, (location.y % self.height) * self.width + location.x % self.width)
+        elif isinstance(location, Entity):
+            return MapCellView(self, location.position.y * self.width + location.position.x)
+        return None
+
+    def halite_array(self):
+        """
+        Returns the halite of every cell, as the live array backing this map.
+        :return: The (height, width) halite array, indexed [y, x]
+        """
+        return self.halite
+
+    def cell_by_id(self, cell_id):
+        """
+        :param cell_id: The id of the cell
+        :return: A view of that cell
+        """
+        return MapCellView(self, cell_id)
+
+    def cell_halite(self, cell_id):
+        """
+        :param cell_id: The id of the cell
+        :return: The halite in that cell, as a Python int
+        """
+        return self._halite_cells[cell_id]
+
+    def cell_ship(self, cell_id):
+        """
+        :param cell_id: The id of the cell
+        :return: The ship marked on that cell, or None
+        """
+        return self._ships.get(cell_id)
+
+    def cell_is_occupied(self, cell_id):
+        """
+        :param cell_id: The id of the cell
+        :return: Whether a ship is marked on that cell
+        """
+        return cell_id in self._ships
+
+    def _set_ship(self, cell_id, ship):
+        """
+        Marks (or, given None, clears) the ship occupying a cell.
+        :param cell_id: The id of the cell
+        :param ship: The ship occupying the cell, or None
+        """
+        if ship is None:
+            self._ships.pop(cell_id, None)
+            self._flat_ship_owner[cell_id] = -1
+            self._flat_ship_id[cell_id] = -1
+        else:
+            self._ships[cell_id] = ship
+            self._flat_ship_owner[cell_id] = ship.owner
+            self._flat_ship_id[cell_id] = ship.id
+
+    def _set_structure(self, cell_id, structure):
+        """
+        Places (or, given None, removes) the structure on a cell.
+        :param cell_id: The id of the cell
+        :param structure: The structure on the cell, or None
+        """
+        if structure is None:
+            self._structures.pop(cell_id, None)
+            self._flat_structure_owner[cell_id] = -1
+        else:
+            self._structures[cell_id] = structure
+            self._flat_structure_owner[cell_id] = structure.owner
+
+    @staticmethod
+    def _generate():
+        """
+        Creates an array backed map object from the input given by the game engine
+        :return: The map object
+        """
+        map_width, map_height = map(int, read_input().split())
+        return ArrayGameMap(read_ints(map_height), map_width, map_height)
+
+    def _update(self, cell_data):
+        """
+        Updates this map object from the input given by the game engine
+        :param cell_data: The integers of this turn's cell update lines, as one flat list
         :return: nothing
         """
         # Mark cells as safe for navigation (will re-mark unsafe cells
         # later)
-        for y in range(self.height):
-            for x in range(self.width):
-                self[Position(x, y)].ship = None
+        for cell_id in self._ships:
+            self._flat_ship_owner[cell_id] = -1
+            self._flat_ship_id[cell_id] = -1
+        self._ships.clear()
 
-        for _ in range(int(read_input())):
-            cell_x, cell_y, cell_energy = map(int, read_input().split())
-            self[Position(cell_x, cell_y)].halite_amount = cell_energy
+        self.halite_changes = [cell_y * self.width + cell_x
+                               for cell_x, cell_y in zip(cell_data[0::3], cell_data[1::3])]
+        if self.halite_changes:
+            self._flat_halite[self.halite_changes] = cell_data[2::3]
+        self._record_halite_changes()
+
+    def _mark_ship(self, cell_id, ship):
+        """
+        Marks a ship as occupying a cell.
+        :param cell_id: The id of the cell
+        :param ship: The ship occupying the cell
+        """
+        self._set_ship(cell_id, ship)
@@ -0,0 +1,244 @@
+"""
+Fleet-wide assignment problems: one-turn move resolution and the like.
+"""
+import heapq
+import itertools
+from collections import deque
+
+from . import constants
+from .positionals import Direction
+
+
+def min_cost_matching(candidates):
+    """
+    Matches rows to columns, each column to at most one row, so that as many
+    rows as possible are matched and, among such matchings, the total cost
+    is lowest.
+
+    Sparse successive shortest augmenting paths (the Hungarian method with
+    Dijkstra over reduced costs): every row only lists the columns it may
+    take, so the work grows with the number of candidate pairs rather than
+    rows times columns. Each row also gets a private "unmatched" column
+    costing more than any real matching, which keeps every row matchable
+    and makes leaving a row unmatched the last resort.
+    :param candidates: A list, per row, of dicts mapping each allowed column to a non-negative cost
+    :return: A list giving each row's column, or None for unmatched rows
+    """
+    unmatched_cost = 1 + sum(max(row_candidates.values(), default=0) for row_candidates in candidates)
+    edges = []
+    for row, row_candidates in enumerate(candidates):
+        row_edges = list(row_candidates.items())
+        row_edges.append((_Unmatched(row), unmatched_cost))
+        edges.append(row_edges)
+
+    row_potential = [0] * len(edges)
+    column_potential = {}
+    column_row = {}
+    row_column = {}
+    # Breaks ties between heap entries without comparing columns
+    order = itertools.count()
+    for row, row_edges in enumerate(edges):
+        distance = {}
+        reached_from = {}
+        frontier = []
+        for column, cost in row_edges:
+            reduced = cost - row_potential[row] - column_potential.get(column, 0)
+            distance[column] = reduced
+            reached_from[column] = row
+            heapq.heappush(frontier, (reduced, next(order), column))
+
+        settled = {}
+        while True:
+            column_distance, _, column = heapq.heappop(frontier)
+            if column in settled or column_distance > distance[column]:
+                continue
+            settled[column] = column_distance
+            if column not in column_row:
+                break
+            next_row = column_row[column]
+            for next_column, cost in edges[next_row]:
+                reduced = (column_distance + cost - row_potential[next_row]
+                           - column_potential.get(next_column, 0))
+                if next_column not in settled and reduced < distance.get(next_column, float('inf')):
+                    distance[next_column] = reduced
+                    reached_from[next_column] = next_row
+                    heapq.heappush(frontier, (reduced, next(order), next_column))
+
+        # Keep reduced costs non-negative and matched pairs tight
+        total = settled.pop(column)
+        row_potential[row] += total
+        for settled_column, column_distance in settled.items():
+            slack = total - column_distance
+            column_potential[settled_column] = column_potential.get(settled_column, 0) - slack
+            row_potential[column_row[settled_column]] += slack
+
+        # Flip the augmenting path back to the new row
+        while True:
+            path_row = reached_from[column]
+            previous_column = row_column.get(path_row)
+            column_row[column] = path_row
+            row_column[path_row] = column
+            if path_row == row:
+                break
+            column = previous_column
+
+    return [None if isinstance(row_column[row], _Unmatched) else row_column[row]
+            for row in range(len(edges))]
+
+
+def resolve_moves(game_map, preferences, blocked=()):
+    """
+    Picks one move per ship for the whole fleet at once so that no two of our
+    ships end up on the same cell, as commands; see plan_moves.
+    :param game_map: The game map
+    :param preferences: A dict of ship -> list of Directions, most preferred first
+    :param blocked: Positions no ship may move onto (e.g. the shipyard when spawning)
+    :return: The list of move commands, one per ship
+    """
+    return [ship.stay_still() if direction == Direction.Still else ship.move(direction)
+            for ship, direction in plan_moves(game_map, preferences, blocked).items()]
+
+
+def plan_moves(game_map, preferences, blocked=()):
+    """
+    Picks one move per ship for the whole fleet at once so that no two of our
+    ships end up on the same cell.
+
+    Each ship ranks the directions it would like to move in. Ships without
+    the halite to leave their cell stay still, and staying still is every
+    other ship's last resort. The moves are then solved as one matching of
+    ships to cells that moves as many ships as possible to a ranked choice
+    and then prefers better ranks overall, so swaps and chains of ships
+    following each other resolve cleanly, whatever order the ships come in.
+    A ship left with no free cell at all stays still.
+    :param game_map: The game map
+    :param preferences: A dict of ship -> list of Directions, most preferred first
+    :param blocked: Positions no ship may move onto (e.g. the shipyard when spawning)
+    :return: A dict of ship -> the Direction it moves in, in the order of preferences
+    """
+    ships = list(preferences)
+    stuck = {game_map.cell_id(ship.position) for ship in ships
+             if ship.halite_amount < game_map[ship.position].halite_amount // constants.MOVE_COST_RATIO}
+    # Cells nobody may move onto; a stuck ship keeps its own cell
+    closed = stuck | {game_map.cell_id(position) for position in blocked}
+
+    candidates = []
+    moves = []
+    for ship in ships:
+        cell_id = game_map.cell_id(ship.position)
+        row_candidates = {}
+        row_moves = {}
+        if cell_id in stuck:
+            row_candidates[cell_id] = 0
+            row_moves[cell_id] = Direction.Still
+        else:
+            ranked = list(preferences[ship])
+            if Direction.Still not in ranked:
+                ranked.append(Direction.Still)
+            for rank, direction in enumerate(ranked):
+                target = game_map.offset_id(cell_id, direction)
+                if target in row_candidates:
+                    continue
+                if target in closed and direction != Direction.Still:
+                    continue
+                row_candidates[target] = rank
+                row_moves[target] = direction
+        candidates.append(row_candidates)
+        moves.append(row_moves)
+
+    return {ship: Direction.Still if target is None else row_moves[target]
+            for ship, row_moves, target in zip(ships, moves, min_cost_matching(candidates))}
+
+
+class AuctionAssignment:
+    """
+    Assigns rows (e.g. ships) to columns (e.g. target cells) to maximize the
+    total benefit, with Bertsekas' auction algorithm.
+
+    Rows bid for their best column, raising its price by how much better it
+    is than their second best plus epsilon, until every row holds a column
+    or prefers none (benefit after price below zero). The result is within
+    epsilon per row of optimal.
+
+    Prices and the assignment persist between calls to solve. A row keeps
+    its previous column while that column is still within epsilon of its
+    best option at current prices, so re-solving after small changes only
+    re-auctions the rows it has to.
+    """
+    def __init__(self, epsilon=0.01):
+        """
+        :param epsilon: The minimum bid increment, and the allowed loss per row
+        """
+        self.epsilon = epsilon
+        self.prices = {}
+        self.assignment = {}
+
+    def solve(self, benefits):
+        """
+        :param benefits: A dict of row -> dict of candidate column -> benefit
+        :return: A dict of row -> assigned column, for the rows that got one
+        """
+        assignment = {}
+        for row, column in self.assignment.items():
+            row_benefits = benefits.get(row)
+            if row_benefits is not None and column in row_benefits:
+                assignment[row] = column
+        # Only held columns carry a price; a free column must cost nothing
+        prices = {column: self.prices[column] for column in assignment.values()}
+
+        # Keep previous pairs while they are within epsilon of the row's best
+        # option; releasing a column drops its price, so recheck until stable
+        while True:
+            released = []
+            for row, column in assignment.items():
+                row_benefits = benefits[row]
+                best_value = max(0, max(benefit - prices.get(other, 0) for other, benefit in row_benefits.items()))
+                if row_benefits[column] - prices[column] < best_value - self.epsilon:
+                    released.append(row)
+            if not released:
+                break
+            for row in released:
+                del prices[assignment.pop(row)]
+
+        owner = {column: row for row, column in assignment.items()}
+        unassigned = deque(row for row in benefits if row not in assignment)
+        while unassigned:
+            row = unassigned.popleft()
+            # Holding no column is worth zero
+            best_column, best_value, second_value = None, 0, 0
+            for column, benefit in benefits[row].items():
+                value = benefit - prices.get(column, 0)
+                if value > best_value:
+                    best_column, best_value, second_value = column, value, best_value
+                elif value > second_value:
+                    second_value = value
+            if best_column is None:
+                continue
+
+            prices[best_column] = prices.get(best_column, 0) + best_value - second_value + self.epsilon
+            outbid = owner.get(best_column)
+            if outbid is not None:
+                del assignment[outbid]
+                unassigned.append(outbid)
+            owner[best_column] = row
+            assignment[row] = best_column
+
+        self.prices = prices
+        self.assignment = assignment
+        return dict(assignment)
+
+
+class _Unmatched:
+    """
+    The private column standing for a row being left unmatched.
+    """
+    __slots__ = ('row',)
+
+    def __init__(self, row):
+        self.row = row
+
+    def __eq__(self, other):
+        return isinstance(other, _Unmatched) and other.row == self.row
+
+    def __hash__(self):
+        return hash((_Unmatched, self.row))
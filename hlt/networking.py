@@ -1,22 +1,72 @@
+import copy
 import json
 import logging
-import sys
+import logging.handlers
+import os
+import queue
+import threading
+import time
 
-from .common import read_input
+from .common import add_log_handler, command_writer, current_streams, read_input, read_ints, redirect_streams
 from . import constants
-from .game_map import GameMap, Player
+from .commands import CONSTRUCT, GENERATE, MOVE
+from .deadline import Deadline
+from .game_map import ArrayGameMap, GameMap, Player
+from .matching import plan_moves
+from .positionals import Direction
+
+# The number of seconds the engine allows a bot for each turn
+TURN_TIME = 2.0
+
+# Environment variable selecting the logging mode when Game is not given one
+LOG_MODE_VARIABLE = "HALITE_LOG_MODE"
+
+# Logger for the structured per-turn summary records
+summary_logger = logging.getLogger("hlt.summary")
+
+# Directions by the character a move command gives them as
+_DIRECTIONS = {Direction.convert(direction): direction
+               for direction in Direction.get_all_cardinals() + [Direction.Still]}
 
 
 class Game:
     """
     The game object holds all metadata pertinent to the game and all its contents
     """
-    def __init__(self):
+    def __init__(self, array_map=False, turn_time=TURN_TIME, safety_margin=0.1, watchdog=False,
+                 log_mode=None, log_level=logging.DEBUG):
         """
         Initiates a game object collecting all start-state instances for the contained items for pre-game.
         Also sets up basic logging.
+
+        Each turn's time is tracked by self.deadline, started when the turn's
+        input arrives, or after an overrun when the watchdog sent the previous
+        turn, since the engine's clock starts then. With the watchdog enabled, a turn still unsent when only
+        safety_margin seconds remain is ended automatically: the commands
+        queued with queue_command are sent, and every other ship takes a move
+        from its choices in move_choices (see hold_idle_ships).
+        :param array_map: Store the map in NumPy arrays (see ArrayGameMap) instead of MapCell objects
+        :param turn_time: The number of seconds available per turn
+        :param safety_margin: The number of seconds per turn held in reserve
+        :param watchdog: Whether to end turns automatically when time runs out
+        :param log_mode: How to log, see configure_logging
+        :param log_level: The lowest level to log
         """
         self.turn_number = 0
+        self.turn_time = turn_time
+        self.safety_margin = safety_margin
+        self.watchdog = watchdog
+        self.deadline = Deadline(turn_time, safety_margin)
+        self.command_queue = []
+        self.move_choices = {}
+        self._turn_lock = threading.Lock()
+        self._turn_sent = True
+        self._watchdog_timer = None
+        # When the watchdog sent the last turn's commands, if it did
+        self._watchdog_sent_at = None
+        # Captured here so the watchdog thread sends and logs where this thread would
+        self._send_line = command_writer()
+        self._streams = current_streams()
 
         # Grab constants JSON
         raw_constants = read_input()
@@ -24,24 +74,22 @@ class Game:
 
         num_players, self.my_id = map(int, read_input().split())
 
-        logging.basicConfig(
-            filename="bot-{}.log".format(self.my_id),
-            filemode="w",
-            level=logging.DEBUG,
-        )
+        configure_logging("bot-{}.log".format(self.my_id), log_mode, log_level)
 
         self.players = {}
         for player in range(num_players):
             self.players[player] = Player._generate()
         self.me = self.players[self.my_id]
-        self.game_map = GameMap._generate()
+        self.game_map = ArrayGameMap._generate() if array_map else GameMap._generate()
+        for player in self.players.values():
+            self.game_map._place_structure(player.shipyard)
 
     def ready(self, name):
         """
         Indicate that your bot is ready to play.
         :param name: The name of your bot
         """
-        send_commands([name])
+        send_commands([name], self._send_line)
 
     def update_frame(self):
         """
@@ -49,38 +97,207 @@ class Game:
         :returns: nothing.
         """
         self.turn_number = int(read_input())
-        logging.info("=============== TURN {:03} ================".format(self.turn_number))
+        # After the watchdog ended the last turn, the engine sent this frame while we were still busy
+        # with it, and its clock has been running since then, not since we got around to reading it
+        start = self._watchdog_sent_at
+        self._watchdog_sent_at = None
+        self.deadline = Deadline(self.turn_time, self.safety_margin, start)
+        logging.info("=============== TURN %03d ================", self.turn_number)
 
         for _ in range(len(self.players)):
             player, num_ships, num_dropoffs, halite = map(int, read_input().split())
-            self.players[player]._update(num_ships, num_dropoffs, halite)
+            self.players[player]._update(num_ships, num_dropoffs, halite,
+                                         read_ints(num_ships + num_dropoffs))
 
-        self.game_map._update()
+        self.game_map._update(read_ints(int(read_input())))
 
         # Mark cells with ships as unsafe for navigation
+        self.game_map._mark_ships([ship for player in self.players.values() for ship in player.get_ships()])
+
+        # Shipyards are placed once at startup; only dropoffs can be new
         for player in self.players.values():
-            for ship in player.get_ships():
-                self.game_map[ship.position].mark_unsafe(ship)
+            for dropoff_id in player.new_dropoff_ids:
+                self.game_map._place_structure(player.get_dropoff(dropoff_id))
 
-            self.game_map[player.shipyard.position].structure = player.shipyard
-            for dropoff in player.get_dropoffs():
-                self.game_map[dropoff.position].structure = dropoff
+        self.command_queue = []
+        self.move_choices = {}
+        self._turn_sent = False
+        if self.watchdog:
+            self._watchdog_timer = threading.Timer(self.deadline.remaining() - self.safety_margin, self._on_deadline)
+            self._watchdog_timer.daemon = True
+            self._watchdog_timer.start()
 
-    @staticmethod
-    def end_turn(commands):
+    def queue_command(self, command):
+        """
+        Queues a command for this turn. Queued commands are what the watchdog
+        sends if the turn runs out of time.
+        :param command: The command to queue
+        :return: nothing.
+        """
+        self.command_queue.append(command)
+
+    def hold_idle_ships(self, commands):
+        """
+        Completes a turn's commands. Each of our ships without a command is
+        given a move from its ranked directions in move_choices (a dict of
+        ship -> list of Directions, most preferred first, reset every turn),
+        or stays still if it has none. The moves are planned together with
+        plan_moves, so these ships neither meet each other nor move onto a
+        cell a commanded ship moves to. A queued spawn is dropped when one of
+        our ships would end the turn on the shipyard.
+        :param commands: The commands issued so far
+        :return: A new list with the given commands followed by the added ones
+        """
+        ships = {ship.id: ship for ship in self.me.get_ships()}
+        commanded = set()
+        ends = []
+        for command in commands:
+            parts = command.split()
+            if parts[0] in (MOVE, CONSTRUCT):
+                commanded.add(int(parts[1]))
+            if parts[0] == MOVE and int(parts[1]) in ships:
+                ship = ships[int(parts[1])]
+                ends.append(self.game_map.normalize(ship.position.directional_offset(_DIRECTIONS[parts[2]])))
+        # Copied first, since the turn's own thread may still be adding choices
+        choices = {ship: list(self.move_choices.get(ship, ())) for ship in ships.values() if ship.id not in commanded}
+        moves = plan_moves(self.game_map, choices, blocked=ends)
+        added = [ship.stay_still() if direction == Direction.Still else ship.move(direction)
+                 for ship, direction in moves.items()]
+        ends.extend(self.game_map.normalize(ship.position.directional_offset(direction))
+                    for ship, direction in moves.items())
+        if self.me.shipyard.position in ends:
+            commands = [command for command in commands if command != GENERATE]
+        return list(commands) + added
+
+    def end_turn(self, commands=None):
         """
         Method to send all commands to the game engine, effectively ending your turn.
-        :param commands: Array of commands to send to engine
+        Does nothing if the watchdog already ended this turn.
+        :param commands: Array of commands to send to engine, by default the queued commands
         :return: nothing.
         """
-        send_commands(commands)
+        if commands is None:
+            commands = self.command_queue
+        with self._turn_lock:
+            if self._turn_sent:
+                logging.warning("Turn %d was already sent, dropping %d commands", self.turn_number, len(commands))
+                return
+            self._turn_sent = True
+            if self._watchdog_timer is not None:
+                self._watchdog_timer.cancel()
+            send_commands(commands, self._send_line)
+
+    def log_summary(self, **fields):
+        """
+        Logs one structured record summarizing this turn on the hlt.summary
+        logger: a JSON object holding the turn number, time used, our ship
+        count and stored halite, plus the given fields.
+        :param fields: Extra JSON serializable values to include
+        :return: nothing.
+        """
+        if not summary_logger.isEnabledFor(logging.INFO):
+            return
+        summary = {
+            "turn": self.turn_number,
+            "elapsed": round(self.deadline.elapsed(), 4),
+            "ships": len(self.me.get_ships()),
+            "halite": self.me.halite_amount,
+        }
+        summary.update(fields)
+        summary_logger.info("%s", json.dumps(summary, default=str))
+
+    def _on_deadline(self):
+        """
+        Ends the turn with the queued commands if it has not been sent yet.
+        Runs on the watchdog thread.
+        :return: nothing.
+        """
+        redirect_streams(*self._streams)
+        with self._turn_lock:
+            if self._turn_sent:
+                return
+            self._turn_sent = True
+            logging.warning("Turn %d ran out of time, sending %d queued commands",
+                            self.turn_number, len(self.command_queue))
+            send_commands(self.hold_idle_ships(self.command_queue), self._send_line)
+            self._watchdog_sent_at = time.perf_counter()
+
+
+_TRACEBACK_FORMATTER = logging.Formatter()
+
+
+class _BackgroundHandler(logging.handlers.QueueHandler):
+    """
+    Queues log records for a background thread that writes them with another handler.
+
+    Records are queued unformatted, so the message is built on the
+    background thread; arguments logged as mutable objects show their state
+    at that point. Exception tracebacks are rendered before queueing, since
+    the frames they refer to move on.
+    """
+    def __init__(self, handler):
+        records = queue.SimpleQueue()
+        super().__init__(records)
+        self._listener = logging.handlers.QueueListener(records, handler)
+        self._listener.start()
+
+    def prepare(self, record):
+        # QueueHandler.prepare formats the whole message on the calling thread
+        if record.exc_info:
+            record = copy.copy(record)
+            if not record.exc_text:
+                record.exc_text = _TRACEBACK_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def close(self):
+        # Drain the queue before closing the wrapped handler
+        if self._listener is not None:
+            self._listener.stop()
+            for handler in self._listener.handlers:
+                handler.close()
+            self._listener = None
+        super().close()
+
+
+def configure_logging(filename, mode=None, level=logging.DEBUG):
+    """
+    Sets up logging for the bot.
+
+    Modes are "off" (discard everything), "sync" (write each record to the
+    file as it is logged) and "async" (hand records to a background thread
+    that writes the file, so logging calls never wait on disk). When mode is
+    None the HALITE_LOG_MODE environment variable is used, and logging is off
+    if that is unset. The file only receives this bot's records, and is closed
+    when the engine ends the game (see hlt.common.add_log_handler).
+    :param filename: The log file to write
+    :param mode: The logging mode
+    :param level: The lowest level to log
+    :return: nothing.
+    """
+    if mode is None:
+        mode = os.environ.get(LOG_MODE_VARIABLE, "off")
+    root = logging.getLogger()
+    if mode == "off":
+        # The NullHandler stops logging.info() and friends from calling basicConfig
+        # Records below WARNING are dropped by the root logger's level check, unless another bot in
+        # this process lowered it, in which case they are dropped by that bot's handler filter
+        if not any(isinstance(handler, logging.NullHandler) for handler in root.handlers):
+            root.addHandler(logging.NullHandler())
+        return
+    if mode not in ("sync", "async"):
+        raise ValueError("Unknown logging mode {!r}".format(mode))
+    file_handler = logging.FileHandler(filename, mode="w")
+    file_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    add_log_handler(file_handler if mode == "sync" else _BackgroundHandler(file_handler))
+    root.setLevel(level)
 
 
-def send_commands(commands):
+def send_commands(commands, send_line=None):
     """
     Sends a list of commands to the engine.
     :param commands: The list of commands to send.
+    :param send_line: How to send the line, by default the calling thread's command_writer()
     :return: nothing.
     """
-    print(" ".join(commands))
-    sys.stdout.flush()
+    (send_line or command_writer())(" ".join(commands))
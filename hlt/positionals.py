@@ -62,9 +62,21 @@ class Direction:
 
 
 class Position:
+    """
+    An (x, y) coordinate, treated as immutable.
+
+    Arithmetic, including += and -=, returns new positions rather than
+    modifying this one, so positions are safe to use as dict and set keys;
+    do not assign to x or y. The hash is computed on first use and kept in a
+    slot. GameMap.normalize returns one shared Position per cell, so
+    normalized positions usually compare by identity.
+    """
+    __slots__ = ('x', 'y', '_hash')
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
+        self._hash = None
 
     def directional_offset(self, direction):
         """
@@ -72,7 +84,7 @@ class Position:
         :param direction: the direction cardinal tuple
         :return: a new position moved in that direction
         """
-        return self + Position(*direction)
+        return Position(self.x + direction[0], self.y + direction[1])
 
     def get_surrounding_cardinals(self):
         """
@@ -80,26 +92,25 @@ class Position:
         """
         return [self.directional_offset(current_direction) for current_direction in Direction.get_all_cardinals()]
 
+    def __reduce__(self):
+        return Position, (self.x, self.y)
+
     def __add__(self, other):
         return Position(self.x + other.x, self.y + other.y)
 
     def __sub__(self, other):
         return Position(self.x - other.x, self.y - other.y)
 
-    def __iadd__(self, other):
-        self.x += other.x
-        self.y += other.y
-        return self
-
-    def __isub__(self, other):
-        self.x -= other.x
-        self.y -= other.y
-        return self
+    # Positions may be shared (see GameMap.normalize) and hashed, so += and -= rebind to a new position
+    __iadd__ = __add__
+    __isub__ = __sub__
 
     def __abs__(self):
         return Position(abs(self.x), abs(self.y))
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if type(other) != type(self):
             return False
         return self.x == other.x and self.y == other.y
@@ -116,6 +127,8 @@ class Position:
         return "{}({}, {})".format(self.__class__.__name__,
                                    self.x,
                                    self.y)
-    
+
     def __hash__(self):
-        return hash((self.x, self.y))
+        if self._hash is None:
+            self._hash = hash((self.x, self.y))
+        return self._hash
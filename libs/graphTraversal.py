@@ -1,5 +1,8 @@
-from collections import deque
-from heapq import *
+from heapq import heappop, heappush
+
+# Adjacency function for searches over GameMap cell ids
+def cellNeighbors(graph, cellID):
+    return graph.neighbor_ids[cellID]
 
 # Extracts path from result
 def getPath(cameFrom, end):
@@ -12,83 +15,196 @@ def getPath(cameFrom, end):
 
     return path
 
-# A* search
-def astar(start, end, graph, heuristicf, costf, disf, adjf):
-    seen = set()
-    searched = set()
-    cameFrom = dict()
-    toSearch = list() # heap
-    
+# A* search from start to end
+# Costs and priorities come from the callbacks:
+#   disf(node, graph)                            distance added by entering node
+#   costf(cost, curr, neighbor, dis, graph)      total cost of reaching neighbor from curr
+#   heuristicf(cost, node, end, dis, graph)      estimated total cost of a path through node
+#   adjf(graph, node)                            neighbors of node
+# Each callback runs at most once per node or edge generated (disf once per node).
+# Stale heap entries are skipped lazily, and ties are broken in insertion order,
+# so results are deterministic.
+# Integer fast path: when nodes are ints in range(len(neighbors)) and neighbors
+# is an adjacency table (e.g. GameMap.neighbor_ids), adjf is not needed and
+# all bookkeeping uses flat lists instead of dicts.
+# The search gives up and returns None after maxExpansions expansions or once
+# deadline.expired() (e.g. an hlt Deadline) is True, so callers can fall back.
+# Returns the path as getPath does, or None if end is unreachable
+def astar(start, end, graph, heuristicf, costf, disf, adjf=None,
+          neighbors=None, maxExpansions=None, deadline=None):
+    if neighbors is not None:
+        return _astarArray(start, end, graph, heuristicf, costf, disf, neighbors, maxExpansions, deadline)
 
+    cameFrom = dict()
+    closed = set()
     tCost = dict() # total cost so far
-    hCost = dict() # total cost so far plus heuristic cost for the rest
+    nodeDis = dict() # disf of each node
+    pathDis = dict() # accumulated distance along the best path
+    toSearch = list() # heap of (heuristic cost, order, node)
+    order = 0
 
-    dis = disf(start, graph)
-
-    tCost[start] = costf(0, start, start, dis, graph)
-    hCost[start] = heuristicf(tCost[start], start, end, dis, graph)
-
-    heappush(toSearch, (hCost[start], dis, start))
-    seen.add(start)
+    nodeDis[start] = disf(start, graph)
+    pathDis[start] = nodeDis[start]
+    tCost[start] = costf(0, start, start, pathDis[start], graph)
+    heappush(toSearch, (heuristicf(tCost[start], start, end, pathDis[start], graph), order, start))
 
+    expansions = 0
     while toSearch:
-        _, dis, curr = heappop(toSearch)
-
+        _, _, curr = heappop(toSearch)
+        if curr in closed:
+            continue # stale entry
         if curr == end:
             return getPath(cameFrom, end)
+        closed.add(curr)
 
-        searched.add(curr)
+        expansions += 1
+        if maxExpansions is not None and expansions > maxExpansions:
+            return None
+        if deadline is not None and deadline.expired():
+            return None
+
+        currCost = tCost[curr]
+        currDis = pathDis[curr]
         for neighbor in adjf(graph, curr):
-            nDis = dis + disf(neighbor, graph)
-            nTCost = costf(tCost[curr], curr, neighbor, nDis, graph)
-            
-            if neighbor in seen and nTCost >= tCost[neighbor]:
+            if neighbor in closed:
+                continue
+            if neighbor not in nodeDis:
+                nodeDis[neighbor] = disf(neighbor, graph)
+            nDis = currDis + nodeDis[neighbor]
+            nTCost = costf(currCost, curr, neighbor, nDis, graph)
+            if neighbor in tCost and nTCost >= tCost[neighbor]:
                 continue
 
             cameFrom[neighbor] = curr
             tCost[neighbor] = nTCost
-            hCost[neighbor] = heuristicf(tCost[neighbor], neighbor, end, nDis, graph)
-
-            if neighbor not in seen:
-                seen.add(neighbor)
-                heapq.heappush(toSearch, (hCost[neighbor], nDis, neighbor))
-
-# Finds the highest valued square within maxDepth of start
-# Returns path to that square
-def bfs_best(start, graph, valf, disf, adjf, maxDepth=0):
-    seen = set()
-    cameFrom = dict()
-    toSearch = deque()
-
-    val = dict()
-    dis = dict()
-    dis[start] = disf(start, graph)
-    val[start] = valf(start, dis, graph)
-
-    toSearch.append((start, 0))
-    seen.add(start)
-
-    best = (val[start], start)
-
+            pathDis[neighbor] = nDis
+            order += 1
+            heappush(toSearch, (heuristicf(nTCost, neighbor, end, nDis, graph), order, neighbor))
+    return None
+
+# A* over integer nodes with an adjacency table, see astar
+def _astarArray(start, end, graph, heuristicf, costf, disf, neighbors, maxExpansions, deadline):
+    size = len(neighbors)
+    cameFrom = [-1] * size
+    closed = bytearray(size)
+    tCost = [None] * size
+    nodeDis = [None] * size
+    pathDis = [0] * size
+    toSearch = list()
+    order = 0
+
+    nodeDis[start] = disf(start, graph)
+    pathDis[start] = nodeDis[start]
+    tCost[start] = costf(0, start, start, pathDis[start], graph)
+    heappush(toSearch, (heuristicf(tCost[start], start, end, pathDis[start], graph), order, start))
+
+    expansions = 0
     while toSearch:
-        curr, depth = toSearch.popleft()
-        
-        best = max(best, (val[curr], curr))
+        _, _, curr = heappop(toSearch)
+        if closed[curr]:
+            continue # stale entry
+        if curr == end:
+            return _getPathArray(cameFrom, start, end)
+        closed[curr] = 1
+
+        expansions += 1
+        if maxExpansions is not None and expansions > maxExpansions:
+            return None
+        if deadline is not None and deadline.expired():
+            return None
+
+        currCost = tCost[curr]
+        currDis = pathDis[curr]
+        for neighbor in neighbors[curr]:
+            if closed[neighbor]:
+                continue
+            dis = nodeDis[neighbor]
+            if dis is None:
+                dis = nodeDis[neighbor] = disf(neighbor, graph)
+            nDis = currDis + dis
+            nTCost = costf(currCost, curr, neighbor, nDis, graph)
+            if tCost[neighbor] is not None and nTCost >= tCost[neighbor]:
+                continue
 
-        if depth == maxDepth:
-            continue
+            cameFrom[neighbor] = curr
+            tCost[neighbor] = nTCost
+            pathDis[neighbor] = nDis
+            order += 1
+            heappush(toSearch, (heuristicf(nTCost, neighbor, end, nDis, graph), order, neighbor))
+    return None
 
-        for neighbor in adjf(graph, curr):
-            nDis = dis + disf(neighbor, graph)
-            nVal = valf(neighbor, nDis, graph)
+# Extracts path from a list based result, matching getPath
+def _getPathArray(cameFrom, start, end):
+    path = list()
 
-            if neighbor not in seen or nVal > val[neighbor]:
-                val[neighbor] = nVal
-                dis[neighbor] = nDis
-                cameFrom[neighbor] = curr
+    while end != start:
+        end = cameFrom[end]
+        path.append(end)
 
-            if neighbor not in seen:
-                toSearch.append((neighbor, depth + 1))
-                seen.add(neighbor)
+    return path
 
-    return getPath(cameFrom, best[1])
+# Shortest paths with a bucket queue (Dial's algorithm), for small integer costs
+# Nodes are ints in range(len(neighbors)) and neighbors is an adjacency table.
+# Moving off node u costs leaveCost[u] + stepCost (non-negative ints).
+# sources is one node or an iterable of nodes, all starting at distance 0.
+# With reverse=True distances are measured from every node to the nearest
+# source instead of from the sources, and prev points towards the source.
+# Nodes farther than maxDis are left unreached.
+# Returns (dis, prev): dis[n] is None and prev[n] is -1 for unreached nodes,
+# prev[n] is -1 for sources
+def dial(sources, neighbors, leaveCost, stepCost=0, reverse=False, maxDis=None):
+    if isinstance(sources, int):
+        sources = [sources]
+    size = len(neighbors)
+    dis = [None] * size
+    prev = [-1] * size
+    done = bytearray(size)
+
+    # Every edge is shorter than the bucket ring, so tentative distances
+    # never wrap onto a bucket still in use
+    ringSize = max(leaveCost, default=0) + stepCost + 1
+    buckets = [list() for _ in range(ringSize)]
+    pending = 0
+    for source in sources:
+        if dis[source] is None:
+            dis[source] = 0
+            buckets[0].append(source)
+            pending += 1
+
+    curr = 0
+    while pending:
+        if maxDis is not None and curr > maxDis:
+            break
+        bucket = buckets[curr % ringSize]
+        while bucket:
+            node = bucket.pop()
+            pending -= 1
+            if done[node] or dis[node] != curr:
+                continue # stale entry
+            done[node] = 1
+            for neighbor in neighbors[node]:
+                if done[neighbor]:
+                    continue
+                nDis = curr + stepCost + (leaveCost[neighbor] if reverse else leaveCost[node])
+                if dis[neighbor] is None or nDis < dis[neighbor]:
+                    dis[neighbor] = nDis
+                    prev[neighbor] = node
+                    buckets[nDis % ringSize].append(neighbor)
+                    pending += 1
+        curr += 1
+
+    if pending:
+        for node in range(size):
+            if not done[node]:
+                dis[node] = None
+                prev[node] = -1
+    return dis, prev
+
+# Dial's algorithm over a GameMap, where leaving a cell costs its halite // moveCostRatio
+# (constants.MOVE_COST_RATIO) plus stepCost; sources are cell ids or positions
+def mapDial(graph, sources, moveCostRatio, stepCost=0, reverse=False, maxDis=None):
+    if not isinstance(sources, (list, tuple, set, frozenset)):
+        sources = [sources]
+    sources = [source if isinstance(source, int) else graph.cell_id(source) for source in sources]
+    leaveCost = [graph.cell_halite(cellID) // moveCostRatio for cellID in range(len(graph.neighbor_ids))]
+    return dial(sources, graph.neighbor_ids, leaveCost, stepCost, reverse, maxDis)
@@ -1,6 +1,6 @@
 #!/bin/bash
 
 cp $1 MyBot.py
-zip bot.zip MyBot.py hlt/*
+zip bot.zip MyBot.py install.sh hlt/*
 rm MyBot.py
 